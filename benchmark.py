@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+# Licensed under the EUPL
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy
+
+import ned
+from cache import ArtifactCache
+from config import Config
+from databasehandler import DatabaseHandler
+
+# descriptions of interactive devices (matched by the default INTERACTION_PATTERNS, see ned.classify_interactions) and of
+# other devices
+INTERACTIVE_DEVICES = ["Switch 3S", "F 1.1", "Remote KF 2.4"]
+OTHER_DEVICES = ["Thermostat", "Window sensor", "Motion sensor", "Smoke detector"]
+
+
+def generate_database(filename: str, message_count: int = 100000, burstiness: float = 0.3, outage_probability: float = 0.0005, interaction_rate: float = 0.05, mean_interarrival: float = 15.0, seed: Optional[int] = None):
+    """
+    Write a synthetic home automation trace with the tables and columns ned.py reads: systems, messages, sources,
+    devices and presence. The trace consists of systems 1, 2 (spanning the date at which ned.py splits it into systems
+    2.1 and 2.2) and 3 (with millisecond timestamps), each with a third of the messages.
+    Parameters:
+        filename The database file to create; an existing file is replaced
+        message_count The total number of messages
+        burstiness The fraction of messages sent in bursts (with a mean IA time of 1 second) instead of with the mean IA time
+        outage_probability The probability that an outage (a gap longer than the system's IA threshold) follows a message
+        interaction_rate The fraction of messages caused by user interactions
+        mean_interarrival The mean IA time of messages outside of bursts (in seconds)
+        seed Seed for the random number generator, for reproducible traces
+    """
+    if os.path.exists(filename):
+        os.remove(filename)
+    rng = numpy.random.default_rng(seed)
+    config = Config()
+    db = sqlite3.connect(filename)
+    db.executescript("""
+        CREATE TABLE systems (system_id INTEGER PRIMARY KEY, description TEXT);
+        CREATE TABLE messages (message_id INTEGER PRIMARY KEY, system_id INTEGER, timestamp REAL);
+        CREATE TABLE devices (device_id INTEGER PRIMARY KEY, system_id INTEGER, description TEXT, send_only INTEGER);
+        CREATE TABLE sources (message_id INTEGER, device_id INTEGER);
+        CREATE TABLE presence (message_id INTEGER);
+    """)
+    message_id: int = 0
+    for system_id, precision in [(1, 1.0), (2, 1.0), (3, 0.001)]:
+        count: int = message_count // 3
+        db.execute("INSERT INTO systems VALUES (?, ?);", (system_id, "System {}".format(system_id)))
+        device_ids: List[int] = []
+        for description in INTERACTIVE_DEVICES + OTHER_DEVICES:
+            device_ids.append(system_id * 100 + len(device_ids))
+            db.execute("INSERT INTO devices VALUES (?, ?, ?, 0);", (device_ids[-1], system_id, description))
+        # IA times: a mixture of bursts and regular traffic, with outages in between
+        ia_times = numpy.where(rng.random(count) < burstiness, rng.exponential(1.0, count), rng.exponential(mean_interarrival, count))
+        threshold: float = config.interarrival_thresholds[system_id if system_id != 2 else "2.1"] * precision
+        outages = rng.random(count) < outage_probability
+        ia_times[outages] += threshold * (1 + rng.exponential(1.0, numpy.count_nonzero(outages)))
+        timestamps = numpy.cumsum(ia_times)
+        # system 2 is split in the middle
+        start: float = 1352588400 - timestamps[count // 2] if system_id == 2 else 1300000000 + system_id * 10**7
+        timestamps = numpy.round(start + timestamps, 3 if precision < 1 else 0)
+        interactive = rng.random(count) < interaction_rate
+        sources = numpy.where(interactive, rng.integers(0, len(INTERACTIVE_DEVICES), count), rng.integers(len(INTERACTIVE_DEVICES), len(device_ids), count))
+        # in system 3, every message with presence information counts as an interaction
+        present = interactive | ((rng.random(count) < 0.5) & (system_id != 3))
+        message_ids = numpy.arange(message_id + 1, message_id + count + 1)
+        message_id += count
+        db.executemany("INSERT INTO messages VALUES (?, ?, ?);", zip(message_ids.tolist(), [system_id] * count, timestamps.tolist()))
+        db.executemany("INSERT INTO sources VALUES (?, ?);", zip(message_ids.tolist(), [device_ids[i] for i in sources.tolist()]))
+        db.executemany("INSERT INTO presence VALUES (?);", ((i,) for i in message_ids[present].tolist()))
+    db.executescript("""
+        CREATE INDEX sources_message_id ON sources (message_id);
+        CREATE INDEX presence_message_id ON presence (message_id);
+    """)
+    db.commit()
+    db.close()
+
+
+class Timer:
+    """
+    Measure the wall-clock time of a block and append it to a list of results
+    """
+    def __init__(self, results: List[Dict[str, Any]], stage: str, **details: Any):
+        self.results = results
+        self.record: Dict[str, Any] = dict(stage=stage, **details)
+
+    def __enter__(self) -> Dict[str, Any]:
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exception):
+        if exception[0] is not None:
+            return
+        self.record["seconds"] = time.perf_counter() - self.start
+        self.results.append(self.record)
+        print("{stage}: {seconds:.3f}s".format(**self.record), {key: value for key, value in self.record.items() if key not in ("stage", "seconds")})
+
+
+def run_benchmark(database: str, config: Config, worker_counts: List[int]) -> List[Dict[str, Any]]:
+    """
+    Time the stages of the evaluation: reading the database in partitions and classifying the user interactions (ingest),
+    generating dummy traffic (dummies), counting samples (count), matching samples against the system output (match)
+    and the whole evaluation (total), for every system, lambda of the config and number of worker processes where
+    applicable.
+    Returns a list of measurements.
+    """
+    results: List[Dict[str, Any]] = []
+    store_directory = tempfile.TemporaryDirectory(prefix="ned-benchmark-")
+    store = ArtifactCache(store_directory.name)
+    dbh = DatabaseHandler(database)
+    # like evaluate, read the partitions through the timestamp index
+    dbh.ensure_timestamp_index()
+    systems = ned.get_systems(dbh)
+    database_fingerprint: str = store.database_fingerprint(database)
+    context = multiprocessing.get_context(config.multiprocessing_start_method)
+    try:
+        for system in systems:
+            genuine_parameters: Dict[str, Any] = ned.genuine_parameters_for(database_fingerprint, system.id, config)
+            for workers in worker_counts:
+                # the interactions are classified again for every number of workers
+                store.remove("interaction_timestamps", ned.classification_parameters(genuine_parameters, system.system_id, config))
+                with context.Pool(workers) as pool:
+                    with Timer(results, "ingest", system=system.id, workers=workers) as record:
+                        # the same stages as in evaluate: the partitions and the interactions are read in parallel
+                        edges: List[Optional[float]] = [None] + ned.plan_partitions(database, system.id, config) + [None]
+                        interactions_read = pool.apply_async(ned.read_interactions, (database, store.directory, system.id, genuine_parameters, config))
+                        partitions = pool.starmap(ned.read_partition, [(database, store.directory, system.id, genuine_parameters, k, edges[k], edges[k+1], config) for k in range(len(edges) - 1)])
+                        genuine: numpy.ndarray = ned.combine_partitions(store, genuine_parameters, len(partitions))
+                        interactions_read.get()
+                        record["items"] = len(genuine)
+                        record["partitions"] = len(partitions)
+            from_ts, to_ts = int(genuine[0]), int(genuine[-1])
+            interactions: numpy.ndarray = store.load("interactions", ned.interactions_parameters(genuine_parameters, config))
+            sample_duration: int = round(config.sample_duration / config.timestamp_precision[system.id])
+            for lambd, _ in config.lambdas:
+                chunks = [(genuine[i:min(i+5001, len(genuine))], system.id, lambd, config) for i in range(0, len(genuine)-1, 5000)]
+                for workers in worker_counts:
+                    with context.Pool(workers, initializer=random.seed) as pool:
+                        with Timer(results, "dummies", system=system.id, lambd=lambd, workers=workers) as record:
+                            output_chunks = pool.starmap(ned.compute_ned_dummies, chunks)
+                            record["items"] = sum(len(chunk) for chunk in output_chunks)
+                output_parameters: Dict[str, Any] = ned.output_parameters_for(genuine_parameters, system.id, lambd, config)
+                output_messages = store.store("output", output_parameters, numpy.concatenate([[genuine[0]]] + [numpy.asarray(chunk, dtype=numpy.int64) for chunk in output_chunks]))
+                output_ia_times = store.store("ia", output_parameters, numpy.diff(output_messages))
+                del output_chunks
+                with Timer(results, "count", system=system.id, lambd=lambd) as record:
+                    ned.compute_sample_totals(output_messages, interactions, system.id, to_ts, sample_duration, config)
+                    record["items"] = len(output_messages)
+                samples_drawn: Dict[str, int] = {"task": 0, "notask": 0}
+                samples = list(ned.draw_samples(output_messages, output_ia_times, interactions, system.id, from_ts, to_ts, sample_duration, samples_drawn, config))
+                with Timer(results, "index", system=system.id, lambd=lambd) as record:
+                    index = ned.InterArrivalIndex(output_messages, output_ia_times, interactions, system.id, sample_duration, config)
+                    index.save(store, ned.suffix_array_parameters(output_parameters, config), ned.index_parameters_for(output_parameters, sample_duration, config))
+                    record["items"] = len(output_messages)
+                handle = index.handle()
+                batches = list(ned.batched(samples, config.sample_batch_size))
+                for workers in worker_counts:
+                    with context.Pool(workers) as pool:
+                        with Timer(results, "match", system=system.id, lambd=lambd, workers=workers) as record:
+                            pool.starmap(ned.compute_matches_batch, [(handle, batch) for batch in batches])
+                            record["items"] = len(samples)
+                del index, handle, output_messages, output_ia_times
+        for workers in worker_counts:
+            with context.Pool(workers, initializer=random.seed) as pool:
+                with Timer(results, "total", workers=workers):
+                    ned.evaluate(database, config.replace(cache_directory=None, checkpoint_directory=None), pool=pool)
+    finally:
+        store_directory.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stages of ned.py on a synthetic database")
+    parser.add_argument("--database", help="use this database instead of generating one")
+    parser.add_argument("--messages", type=int, default=100000, help="number of messages of the generated database")
+    parser.add_argument("--burstiness", type=float, default=0.3, help="fraction of messages sent in bursts")
+    parser.add_argument("--outages", type=float, default=0.0005, help="probability of an outage after a message")
+    parser.add_argument("--interactions", type=float, default=0.05, help="fraction of messages caused by user interactions")
+    parser.add_argument("--seed", type=int, default=0, help="seed for generating the database")
+    parser.add_argument("--lambdas", default="-1,0.01,0.1", help="comma-separated values for lambda")
+    parser.add_argument("--workers", default="1,{}".format(os.cpu_count() or 1), help="comma-separated numbers of worker processes")
+    parser.add_argument("--samples", type=int, default=200, help="number of samples to match")
+    parser.add_argument("--output", default="ned-benchmark.jsonl", help="file to append the results to (one JSON object per measurement)")
+    arguments = parser.parse_args()
+
+    config = Config(
+        lambdas=[(float(lambd), "") for lambd in arguments.lambdas.split(",")],
+        sample_count=arguments.samples,
+        cache_directory=None,
+        checkpoint_directory=None,
+    )
+    worker_counts: List[int] = sorted({int(workers) for workers in arguments.workers.split(",")})
+    generator: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="ned-benchmark-") as directory:
+        database: str = arguments.database
+        if database is None:
+            generator = {
+                "message_count": arguments.messages,
+                "burstiness": arguments.burstiness,
+                "outage_probability": arguments.outages,
+                "interaction_rate": arguments.interactions,
+                "seed": arguments.seed,
+            }
+            database = os.path.join(directory, "benchmark.sqlite")
+            print("Generating database...", end="")
+            sys.stdout.flush()
+            generate_database(database, **generator)
+            print(" ✓")
+        results = run_benchmark(database, config, worker_counts)
+
+    # describe the run, so results of different versions and machines can be compared
+    try:
+        commit: Optional[str] = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    run: Dict[str, Any] = {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "host": socket.gethostname(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "database": arguments.database,
+        "generator": generator,
+        "sample_count": config.sample_count,
+        "backend": config.dummy_backend,
+    }
+    with open(arguments.output, "a") as f:
+        for result in results:
+            print(json.dumps(dict(run, **result), default=str), file=f)
+    print("Results appended to {}".format(arguments.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Licensed under the EUPL
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, Optional
+
+import numpy
+
+
+class ArtifactCache:
+    """
+    On-disk cache of intermediate arrays (genuine timestamps, system output, user interactions), stored as .npy files
+    and loaded memory-mapped.
+    Every artifact is identified by a kind (e.g. "genuine") and a dictionary of all parameters it depends on; changing
+    any of these parameters results in a different file, so stale entries are never loaded. The least recently used
+    entries are evicted once the cache grows beyond max_bytes (if given).
+    """
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def database_fingerprint(self, filename: str) -> str:
+        """
+        Return the SHA-256 hash of a database file.
+        Hashing large databases takes a while, so the hash is remembered for the file's path, size and modification time.
+        """
+        stat = os.stat(filename)
+        fingerprints_file = os.path.join(self.directory, "databases.json")
+        try:
+            with open(fingerprints_file) as f:
+                fingerprints: Dict[str, str] = json.load(f)
+        except (OSError, ValueError):
+            fingerprints = {}
+        file_key = "{}:{}:{}".format(os.path.realpath(filename), stat.st_size, stat.st_mtime_ns)
+        if file_key not in fingerprints:
+            digest = hashlib.sha256()
+            with open(filename, "rb") as f:
+                for block in iter(lambda: f.read(1 << 24), b""):
+                    digest.update(block)
+            fingerprints[file_key] = digest.hexdigest()
+            with open(fingerprints_file + ".tmp", "w") as f:
+                json.dump(fingerprints, f)
+            os.replace(fingerprints_file + ".tmp", fingerprints_file)
+        return fingerprints[file_key]
+
+    def path(self, kind: str, parameters: Dict[str, Any]) -> str:
+        key = hashlib.sha256(json.dumps(parameters, sort_keys=True, default=str).encode()).hexdigest()
+        return os.path.join(self.directory, "{}-{}.npy".format(kind, key[0:32]))
+
+    def load(self, kind: str, parameters: Dict[str, Any]) -> Optional[numpy.ndarray]:
+        """
+        Return the cached array memory-mapped (read-only) or None if it is not in the cache.
+        """
+        filename = self.path(kind, parameters)
+        try:
+            array = numpy.load(filename, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        # mark as recently used
+        os.utime(filename)
+        return array
+
+    def store(self, kind: str, parameters: Dict[str, Any], array: numpy.ndarray, evict: bool = True) -> numpy.ndarray:
+        """
+        Write an array to the cache and return it memory-mapped.
+        Worker processes should pass evict=False, so they do not evict entries other processes are still using.
+        """
+        filename = self.path(kind, parameters)
+        with open(filename + ".tmp", "wb") as f:
+            numpy.save(f, array)
+        os.replace(filename + ".tmp", filename)
+        # describe the entry so the cache directory can be inspected by hand
+        with open(filename[0:-4] + ".json", "w") as f:
+            json.dump({"kind": kind, "parameters": parameters}, f, sort_keys=True, default=str)
+        if evict:
+            self.evict(keep=[filename])
+        return numpy.load(filename, mmap_mode="r")
+
+    def store_chunks(self, kind: str, parameters: Dict[str, Any], chunks: Iterable[numpy.ndarray], length: int, dtype: Any = numpy.int64, evict: bool = True) -> numpy.ndarray:
+        """
+        Write an array of the given length from consecutive chunks to the cache and return it memory-mapped.
+        Only one chunk is held in memory at a time, so arrays larger than the available memory can be stored.
+        """
+        filename = self.path(kind, parameters)
+        array = numpy.lib.format.open_memmap(filename + ".tmp", mode="w+", dtype=dtype, shape=(length,))
+        position: int = 0
+        for chunk in chunks:
+            array[position:position+len(chunk)] = chunk
+            position += len(chunk)
+        if position != length:
+            raise ValueError("Expected {} items for {}, got {}".format(length, kind, position))
+        array.flush()
+        del array
+        os.replace(filename + ".tmp", filename)
+        with open(filename[0:-4] + ".json", "w") as f:
+            json.dump({"kind": kind, "parameters": parameters}, f, sort_keys=True, default=str)
+        if evict:
+            self.evict(keep=[filename])
+        return numpy.load(filename, mmap_mode="r")
+
+    def remove(self, kind: str, parameters: Dict[str, Any]):
+        """
+        Remove an entry from the cache (if it exists).
+        """
+        filename = self.path(kind, parameters)
+        for name in (filename, filename[0:-4] + ".json"):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def evict(self, keep: Iterable[str] = ()):
+        """
+        Remove the least recently used entries until the cache is no larger than max_bytes.
+        Entries whose file names (see path) are in keep are never removed, e.g. those which are still in use.
+        """
+        keep = set(keep)
+        if self.max_bytes is None:
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+            filename = os.path.join(self.directory, name)
+            stat = os.stat(filename)
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        total: int = sum(entry[1] for entry in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if filename in keep:
+                continue
+            os.remove(filename)
+            if os.path.exists(filename[0:-4] + ".json"):
+                os.remove(filename[0:-4] + ".json")
+            total -= size
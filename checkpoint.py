@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# Licensed under the EUPL
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy
+
+
+class Checkpoint:
+    """
+    The progress of the evaluation of one system and lambda (or one sample duration of it).
+    Every update is written to disk immediately (unless filename is None), so a run can be resumed after a crash.
+    The drawn samples and the matches of the evaluated batches can be large, so they are not part of the JSON file: the
+    samples are written once to an .npy file (see store_samples), the matches of every batch are appended to a log as
+    one JSON line (see add_matches).
+    """
+    def __init__(self, filename: Optional[str] = None):
+        self.filename = filename
+        self.data: Dict[str, Any] = {}
+        # the matches of every evaluated batch of samples, by the batch number as a string
+        self.matches: Dict[str, List[Tuple[int, int]]] = {}
+        self._samples: Optional[Tuple[numpy.ndarray, numpy.ndarray]] = None
+        if filename is None:
+            return
+        if os.path.exists(filename):
+            with open(filename) as f:
+                self.data = json.load(f)
+        if os.path.exists(self._path("matches.jsonl")):
+            complete: int = 0
+            with open(self._path("matches.jsonl"), "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    self.matches[str(entry["batch"])] = entry["matches"]
+                    complete += len(line)
+            # the last line may be incomplete after a crash
+            os.truncate(self._path("matches.jsonl"), complete)
+        if "samples" in self.data:
+            # checkpoints of earlier versions contain the samples and matches
+            samples: List[List[int]] = self.data.pop("samples")
+            matches: Dict[str, List[Tuple[int, int]]] = self.data.pop("matches", {})
+            self.store_samples(numpy.array([value for sample in samples for value in sample], dtype=numpy.int64), numpy.array([len(sample) for sample in samples], dtype=numpy.int64))
+            for batch, batch_matches in matches.items():
+                self.add_matches(int(batch), batch_matches)
+            self.save()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def update(self, **values):
+        self.data.update(values)
+        self.save()
+
+    def reset(self, **values):
+        self.data = dict(values)
+        self._remove_samples()
+        self.save()
+
+    def store_samples(self, values: numpy.ndarray, lengths: numpy.ndarray):
+        """
+        Store the drawn samples, given as their concatenated IA times and their lengths. The matches of earlier samples
+        are discarded.
+        """
+        self._remove_samples()
+        self._samples = (values, lengths)
+        if self.filename is None:
+            return
+        # one array: the number of samples, their lengths and their IA times
+        with open(self._path("samples.npy.tmp"), "wb") as f:
+            numpy.save(f, numpy.concatenate([[len(lengths)], lengths, values]).astype(numpy.int64))
+        os.replace(self._path("samples.npy.tmp"), self._path("samples.npy"))
+
+    def samples(self) -> Optional[Tuple[numpy.ndarray, numpy.ndarray]]:
+        """
+        Return the stored samples as their concatenated IA times and their lengths, or None if there are none.
+        """
+        if self._samples is None and self.filename is not None and os.path.exists(self._path("samples.npy")):
+            stored = numpy.load(self._path("samples.npy"), mmap_mode="r")
+            count = int(stored[0])
+            self._samples = (stored[1+count:], stored[1:1+count])
+        return self._samples
+
+    def add_matches(self, batch: int, matches: List[Tuple[int, int]]):
+        """
+        Record the matches of a batch of samples.
+        """
+        self.matches[str(batch)] = matches
+        if self.filename is None:
+            return
+        with open(self._path("matches.jsonl"), "a") as f:
+            print(json.dumps({"batch": batch, "matches": matches}), file=f)
+
+    def _path(self, suffix: str) -> str:
+        return os.path.splitext(self.filename)[0] + "-" + suffix
+
+    def _remove_samples(self):
+        self._samples = None
+        self.matches = {}
+        if self.filename is None:
+            return
+        for name in ("samples.npy", "matches.jsonl"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+    def save(self):
+        if self.filename is None:
+            return
+        with open(self.filename + ".tmp", "w") as f:
+            json.dump(self.data, f)
+        os.replace(self.filename + ".tmp", self.filename)
+
+
+class RunCheckpoints:
+    """
+    Checkpoints of all systems and lambdas of a run.
+    Runs are identified by all parameters which influence their results, so a run can only be resumed with the same
+    database and settings. Unless resume is set, existing checkpoints of the same run are discarded.
+    """
+    def __init__(self, directory: Optional[str], run_parameters: Dict[str, Any], resume: bool):
+        self.directory: Optional[str] = None
+        if directory is None:
+            return
+        key = hashlib.sha256(json.dumps(run_parameters, sort_keys=True, default=str).encode()).hexdigest()
+        self.directory = os.path.join(directory, "run-{}".format(key[0:32]))
+        if not resume and os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "run.json"), "w") as f:
+            json.dump(run_parameters, f, sort_keys=True, default=str)
+
+    def pair(self, system_id: Union[str, int], lambd: float, sample_duration: Optional[float] = None) -> Checkpoint:
+        """
+        Return the checkpoint of a system and lambda, or of one of its sample durations if sample_duration is given.
+        """
+        if self.directory is None:
+            return Checkpoint()
+        if sample_duration is None:
+            return Checkpoint(os.path.join(self.directory, "{}-{!r}.json".format(system_id, lambd)))
+        return Checkpoint(os.path.join(self.directory, "{}-{!r}-{!r}.json".format(system_id, lambd, sample_duration)))
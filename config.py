@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+# Licensed under the EUPL
+
+import copy
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import settings
+
+
+class Config:
+    """
+    All parameters of an evaluation, passed explicitly to every stage instead of reading the settings module.
+    Parameters which are not given are taken from settings.py (see there for their meaning); the attribute names are the
+    lowercase names of the settings. Config objects are picklable, so they can be sent to worker processes regardless of
+    the start method.
+    """
+    lambdas: List[Tuple[float, str]]
+    interarrival_thresholds: Dict[Union[int, str], int]
+    sample_count: int
+    sample_duration: float
+    sample_durations: Optional[List[float]]
+    sample_timeout: float
+    interaction_patterns: List[str]
+    interaction_systems: List[Union[int, str]]
+    timestamp_precision: Dict[Union[int, str], float]
+    dummy_backend: str
+    lambda_sweep: bool
+    seed: Optional[int]
+    ia_index_depth: int
+    estimation_mode: str
+    cache_directory: Optional[str]
+    cache_max_bytes: Optional[int]
+    sample_batch_size: int
+    multiprocessing_start_method: Optional[str]
+    max_running_jobs: Optional[int]
+    memory_limit: Optional[int]
+    ingest_partition_rows: int
+    results_formats: List[str]
+    adaptive_stopping: bool
+    stopping_patience: int
+    stopping_tolerance: float
+    stopping_confidence: float
+    stopping_increase_probability: float
+    checkpoint_directory: Optional[str]
+    trace_file: Optional[str]
+    profile_stages: List[str]
+    profile_directory: str
+
+    def __init__(self, **parameters: Any):
+        for name in self.__annotations__:
+            if name in parameters:
+                setattr(self, name, parameters.pop(name))
+            else:
+                setattr(self, name, copy.deepcopy(getattr(settings, name if name == "lambdas" else name.upper())))
+        if parameters:
+            raise TypeError("Unknown parameters: {}".format(", ".join(parameters)))
+
+    def replace(self, **parameters: Any) -> "Config":
+        """
+        Return a copy with the given parameters changed.
+        """
+        return Config(**dict({name: getattr(self, name) for name in self.__annotations__}, **parameters))
+
+    def durations(self) -> List[float]:
+        """
+        Return the sample durations to evaluate.
+        """
+        return list(self.sample_durations) if self.sample_durations else [self.sample_duration]
+
+    def run_parameters(self) -> Dict[str, Any]:
+        """
+        Return the parameters which influence the results of an evaluation (e.g. for identifying checkpoints).
+        """
+        return {
+            "lambdas": [lambd for lambd, _ in self.lambdas],
+            "thresholds": {str(system_id): threshold for system_id, threshold in self.interarrival_thresholds.items()},
+            "precision": {str(system_id): precision for system_id, precision in self.timestamp_precision.items()},
+            "sample_count": self.sample_count,
+            "sample_duration": self.sample_duration,
+            "sample_durations": self.sample_durations,
+            "interaction_patterns": self.interaction_patterns,
+            "interaction_systems": self.interaction_systems,
+            "mode": self.estimation_mode,
+            "backend": self.dummy_backend,
+            "sweep": self.lambda_sweep,
+            "seed": self.seed,
+            "stopping": [self.adaptive_stopping, self.stopping_patience, self.stopping_tolerance, self.stopping_confidence, self.stopping_increase_probability],
+        }
@@ -2,15 +2,29 @@
 
 # Licensed under the EUPL
 
-from typing import Tuple, Union
+from typing import List, Optional, Tuple, Union
+import math
+import os
 import sqlite3
+import urllib.parse
+
+import numpy
 
 NULL = "NULL"
 
 
 class DatabaseHandler:
-    def __init__(self, filename):
-        self._db = sqlite3.connect(filename)
+    def __init__(self, filename, read_only = False):
+        """
+        Parameters:
+            filename The database file
+            read_only Open the database read-only and immutable, so several processes can read it concurrently without
+                any locking; the database must not be modified while it is open
+        """
+        if read_only:
+            self._db = sqlite3.connect("file:{}?mode=ro&immutable=1".format(urllib.parse.quote(os.path.abspath(filename))), uri=True)
+        else:
+            self._db = sqlite3.connect(filename)
         self._device_ids = {}
 
         self._messages = {}
@@ -18,6 +32,7 @@ class DatabaseHandler:
         self._systems = {}
         self._cursor = None
         self._cursor_last_action_read = True
+        self._timestamp_index_checked = False
     
     def __del__(self):
         self._db.commit()
@@ -35,19 +50,114 @@ class DatabaseHandler:
             self._cursor_last_action_read = read
         return self._cursor
 
-    def messages(self, system_id, from_timestamp = None, to_timestamp = None):
+    def ensure_timestamp_index(self):
+        """
+        Create an index on (system_id, timestamp) if there is none yet, so that time range queries become index seeks.
+        If the database is read-only, the index is not created and queries fall back to table scans.
+        """
+        if self._timestamp_index_checked:
+            return
+        self._timestamp_index_checked = True
+        cursor = self._db.cursor()
+        for index in cursor.execute("PRAGMA index_list(messages);").fetchall():
+            columns = [row[2] for row in self._db.execute("PRAGMA index_info({});".format(index[1]))]
+            if columns[0:2] == ["system_id", "timestamp"]:
+                return
+        try:
+            cursor.execute("CREATE INDEX IF NOT EXISTS messages_system_id_timestamp ON messages (system_id, timestamp);")
+            self._db.commit()
+        except sqlite3.OperationalError:
+            pass
+
+    def _range_condition(self, system_id, from_timestamp = None, to_timestamp = None, before_timestamp = None) -> Tuple[str, list]:
         parameters = [system_id]
-        from_part = to_part = ""
+        from_part = to_part = before_part = ""
         if from_timestamp is not None:
             from_part = "AND timestamp >= ?"
             parameters.append(from_timestamp)
         if to_timestamp is not None:
             to_part = "AND timestamp <= ?"
             parameters.append(to_timestamp)
+        if before_timestamp is not None:
+            before_part = "AND timestamp < ?"
+            parameters.append(before_timestamp)
+        return "system_id = ? {} {} {}".format(from_part, to_part, before_part), parameters
+
+    def messages(self, system_id, from_timestamp = None, to_timestamp = None):
+        self.ensure_timestamp_index()
+        condition, parameters = self._range_condition(system_id, from_timestamp, to_timestamp)
         cursor = self._db.cursor()
-        for row in cursor.execute("SELECT * FROM messages WHERE system_id = ? {} {} ORDER BY timestamp ASC;".format(from_part, to_part), parameters):
+        for row in cursor.execute("SELECT * FROM messages WHERE {} ORDER BY timestamp ASC;".format(condition), parameters):
             yield Message(self, *row)
 
+    def timestamps(self, system_id, from_timestamp = None, to_timestamp = None, precision: float = 1.0, batch_size: int = 1000000, before_timestamp = None) -> numpy.ndarray:
+        """
+        Return the sorted message timestamps of a system as an int64 array, divided by precision and rounded.
+        Rows are fetched in batches of batch_size instead of creating a Message object per row.
+        """
+        self.ensure_timestamp_index()
+        condition, parameters = self._range_condition(system_id, from_timestamp, to_timestamp, before_timestamp)
+        cursor = self._db.cursor()
+        cursor.execute("SELECT timestamp FROM messages WHERE {} ORDER BY timestamp ASC;".format(condition), parameters)
+        batches = []
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batches.append(numpy.fromiter((row[0] for row in rows), dtype=numpy.float64, count=len(rows)))
+        if not batches:
+            return numpy.zeros(0, dtype=numpy.int64)
+        timestamps = numpy.concatenate(batches)
+        del batches
+        # numpy.rint rounds half to even, just like round()
+        return numpy.rint(timestamps / precision).astype(numpy.int64)
+
+    def partition_bounds(self, system_id, from_timestamp = None, to_timestamp = None, partition_rows: int = 1000000) -> List[float]:
+        """
+        Split the messages of a system into partitions of about partition_rows messages each.
+        Returns the timestamps at which the partitions start (after the first one); partition k contains the timestamps
+        t with bounds[k-1] <= t < bounds[k], so messages with the same timestamp are always in the same partition.
+        The time range is split into intervals of equal length, which are counted on the timestamp index; intervals with
+        more than partition_rows messages are split further, then neighbouring intervals are combined into partitions.
+        Counting only reads the index, so this takes a fraction of the time needed to read the messages.
+        """
+        self.ensure_timestamp_index()
+        condition, parameters = self._range_condition(system_id, from_timestamp, to_timestamp)
+        cursor = self._db.cursor()
+        count: int = cursor.execute("SELECT COUNT(*) FROM messages WHERE {};".format(condition), parameters).fetchone()[0]
+        if count <= partition_rows:
+            return []
+        first: float = cursor.execute("SELECT timestamp FROM messages WHERE {} ORDER BY timestamp ASC LIMIT 1;".format(condition), parameters).fetchone()[0]
+        last: float = cursor.execute("SELECT timestamp FROM messages WHERE {} ORDER BY timestamp DESC LIMIT 1;".format(condition), parameters).fetchone()[0]
+
+        def count_interval(start: float, end: float) -> int:
+            return cursor.execute("SELECT COUNT(*) FROM messages WHERE {} AND timestamp >= ? AND timestamp < ?;".format(condition), parameters + [start, end]).fetchone()[0]
+
+        # intervals [start, end) with their number of messages; the last one ends just after the last timestamp
+        end: float = math.nextafter(last, math.inf)
+        splits: int = 16 * -(-count // partition_rows)
+        edges: List[float] = sorted({first + (end - first) * i / splits for i in range(splits)} | {end})
+        pending: List[Tuple[float, float]] = list(zip(edges[:-1], edges[1:]))[::-1]
+        intervals: List[Tuple[float, int]] = []
+        while pending:
+            start, end = pending.pop()
+            interval_count: int = count_interval(start, end)
+            middle: float = start + (end - start) / 2
+            if interval_count > partition_rows and start < middle < end:
+                # bursts: split the interval in two
+                pending.extend([(middle, end), (start, middle)])
+            elif interval_count > 0:
+                intervals.append((start, interval_count))
+        # combine neighbouring intervals
+        bounds: List[float] = []
+        partition_count: int = 0
+        for start, interval_count in intervals:
+            if partition_count > 0 and partition_count + interval_count > partition_rows:
+                bounds.append(start)
+                partition_count = 0
+            partition_count += interval_count
+        return bounds
+
     def systems(self):
         cursor = self._db.cursor()
         for row in cursor.execute("SELECT * FROM systems;"):
@@ -62,15 +172,59 @@ class Message:
         self.timestamp: float = timestamp
 
 class System:
-    def __init__(self, dbhandler, id, description):
+    def __init__(self, dbhandler, id, description, system_id = None, from_timestamp = None, to_timestamp = None):
+        """
+        A system of the database or a view of the messages of a system within a time range (see view)
+        Parameters:
+            id The id of the system (or view)
+            description The description of the system (or view)
+            system_id The id of the system in the database, if this is a view
+            from_timestamp The first timestamp of the view (None for the first message of the system)
+            to_timestamp The last timestamp of the view (None for the last message of the system)
+        """
         self._dbh = dbhandler
         self.id = id
         self.description = description
+        self.system_id = system_id if system_id is not None else id
+        self.from_timestamp = from_timestamp
+        self.to_timestamp = to_timestamp
+
+    def view(self, id, description, from_timestamp = None, to_timestamp = None) -> "System":
+        """
+        Return a view of the messages of this system within [from_timestamp, to_timestamp], which behaves like a system
+        of its own (e.g. for systems which are split at some date)
+        """
+        return System(self._dbh, id, description, self.system_id, from_timestamp, to_timestamp)
+
+    def _range(self, from_timestamp = None, to_timestamp = None) -> Tuple[Optional[float], Optional[float]]:
+        # the given range, restricted to the range of the view
+        if from_timestamp is None or (self.from_timestamp is not None and self.from_timestamp > from_timestamp):
+            from_timestamp = self.from_timestamp
+        if to_timestamp is None or (self.to_timestamp is not None and self.to_timestamp < to_timestamp):
+            to_timestamp = self.to_timestamp
+        return from_timestamp, to_timestamp
 
     def messages(self, from_timestamp = None, to_timestamp = None):
-        for message in self._dbh.messages(self.id, from_timestamp, to_timestamp):
+        for message in self._dbh.messages(self.system_id, *self._range(from_timestamp, to_timestamp)):
             yield message
 
+    def timestamps_array(self, precision: float = 1.0, from_timestamp = None, to_timestamp = None, before_timestamp = None) -> numpy.ndarray:
+        """
+        Return the timestamps of all messages as a sorted int64 array, scaled by 1/precision and rounded
+        Parameters:
+            precision The timestamp precision of the system (see settings.TIMESTAMP_PRECISION)
+            from_timestamp Only return timestamps >= from_timestamp
+            to_timestamp Only return timestamps <= to_timestamp
+            before_timestamp Only return timestamps < before_timestamp
+        """
+        return self._dbh.timestamps(self.system_id, *self._range(from_timestamp, to_timestamp), precision, before_timestamp=before_timestamp)
+
+    def partition_bounds(self, partition_rows: int) -> List[float]:
+        """
+        Split the messages into partitions of about partition_rows messages (see DatabaseHandler.partition_bounds)
+        """
+        return self._dbh.partition_bounds(self.system_id, self.from_timestamp, self.to_timestamp, partition_rows)
+
     def timespan(self, override_from = None, override_to = None, fix = True) -> Tuple[float, float]:
         """
         Return the timespan of the system as a 2-tuple (first_message_timestamp, last_message_timestamp)
@@ -79,24 +233,30 @@ class System:
             override_to Override the last message timestamp with this value
             fix Fix the override values to match actual timestamps (i.e. return the first timestamp >= override_from and the last timestamp <= override_to)
         """
+        self._dbh.ensure_timestamp_index()
         cursor = self._dbh.cursor()
+        # views are limited to their range
+        if override_from is None:
+            override_from = self.from_timestamp
+        if override_to is None:
+            override_to = self.to_timestamp
         if override_from is not None:
             if fix:
-                cursor.execute("SELECT timestamp FROM messages WHERE system_id = ? AND timestamp >= ? ORDER BY timestamp ASC LIMIT 1;", (self.id, override_from))
+                cursor.execute("SELECT timestamp FROM messages WHERE system_id = ? AND timestamp >= ? ORDER BY timestamp ASC LIMIT 1;", (self.system_id, override_from))
                 from_ts = cursor.fetchone()[0]
             else:
                 from_ts = override_from
         else:
-            cursor.execute("SELECT timestamp FROM messages WHERE system_id = ? ORDER BY timestamp ASC LIMIT 1;", (self.id,))
+            cursor.execute("SELECT timestamp FROM messages WHERE system_id = ? ORDER BY timestamp ASC LIMIT 1;", (self.system_id,))
             from_ts = cursor.fetchone()[0]
         if override_to is not None:
             if fix:
-                cursor.execute("SELECT timestamp FROM messages WHERE system_id = ? AND timestamp <= ? ORDER BY timestamp DESC LIMIT 1;", (self.id, override_to))
+                cursor.execute("SELECT timestamp FROM messages WHERE system_id = ? AND timestamp <= ? ORDER BY timestamp DESC LIMIT 1;", (self.system_id, override_to))
                 to_ts = cursor.fetchone()[0]
             else:
                 to_ts = override_to
         else:
-            cursor.execute("SELECT timestamp FROM messages WHERE system_id = ? ORDER BY timestamp DESC LIMIT 1;", (self.id,))
+            cursor.execute("SELECT timestamp FROM messages WHERE system_id = ? ORDER BY timestamp DESC LIMIT 1;", (self.system_id,))
             to_ts = cursor.fetchone()[0]
         return from_ts, to_ts
 
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+# Licensed under the EUPL
+
+import cProfile
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows; peak memory usage is not recorded there
+    resource = None
+
+# item counts of the job running in this process (e.g. dummies generated or samples rejected), see count
+counters: Dict[str, int] = {}
+# the peak RSS of this process before the last reset (see reset_peak_rss)
+_lifetime_peak_rss: int = 0
+
+
+def count(name: str, amount: int = 1):
+    """
+    Add to an item count of the current job. Counts are only collected for jobs run through run_instrumented.
+    """
+    counters[name] = counters.get(name, 0) + amount
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Return the peak resident set size of this process (in bytes) since the last reset (see reset_peak_rss), or None if
+    it is not available.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    # given in kilobytes
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss is given in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak resident set size of this process to its current resident set size, so the peak of the next job can
+    be measured. Only possible on Linux; returns whether the peak was reset.
+    """
+    global _lifetime_peak_rss
+    peak: Optional[int] = peak_rss()
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    _lifetime_peak_rss = max(_lifetime_peak_rss, peak or 0)
+    return True
+
+
+def lifetime_peak_rss() -> Optional[int]:
+    """
+    Return the peak resident set size of this process (in bytes) since it was started, or None if it is not available.
+    """
+    peak: Optional[int] = peak_rss()
+    return None if peak is None else max(peak, _lifetime_peak_rss)
+
+
+def run_instrumented(function: Callable, args: Sequence, profile_file: Optional[str] = None) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Run function(*args) and measure it. If profile_file is given, the function is run under cProfile and the
+    statistics are written to that file.
+    Returns the function's result and the measurements: wall time, CPU time (both in seconds), peak RSS of the process
+    during the job (None if it cannot be measured per job and the job did not exceed the earlier peak of the process),
+    its process id and the item counts.
+    """
+    counters.clear()
+    # where the peak cannot be reset, it is only known to be the job's if the job raised it
+    reset: bool = reset_peak_rss()
+    rss_start: Optional[int] = peak_rss()
+    wall_start: float = time.perf_counter()
+    cpu_start: float = time.process_time()
+    if profile_file is not None:
+        profile = cProfile.Profile()
+        result = profile.runcall(function, *args)
+        profile.dump_stats(profile_file)
+    else:
+        result = function(*args)
+    max_rss: Optional[int] = peak_rss()
+    if not reset and (max_rss is None or rss_start is None or max_rss <= rss_start):
+        max_rss = None
+    metrics: Dict[str, Any] = {
+        "wall": time.perf_counter() - wall_start,
+        "cpu": time.process_time() - cpu_start,
+        "max_rss": max_rss,
+        "pid": os.getpid(),
+        "counts": dict(counters),
+    }
+    counters.clear()
+    return result, metrics
+
+
+class Tracer:
+    """
+    Record the measurements of all jobs of an evaluation as a JSONL trace (one JSON object per line).
+    Every finished job is written as a "job" event with its measurements and the state of the scheduler (running jobs
+    and queue depth); finish writes a "summary" event with the totals per stage, system and lambda and the utilization
+    of the worker pool. Jobs whose stage (the first element of the job name) is in profile_stages are run under cProfile;
+    the statistics are written to profile_directory.
+    """
+    def __init__(self, filename: str, workers: Optional[int], profile_stages: Sequence[str] = (), profile_directory: Optional[str] = None):
+        self._file = open(filename, "w")
+        self._workers = workers
+        self._profile_stages = set(profile_stages)
+        self._profile_directory = profile_directory
+        if self._profile_stages and profile_directory is not None:
+            os.makedirs(profile_directory, exist_ok=True)
+        self._start: float = time.perf_counter()
+        self._worker_time: float = 0.0
+        self._stages: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+
+    @staticmethod
+    def _labels(name: Hashable) -> Tuple[str, Any, Any]:
+        # job names are (stage, system, lambda, ...) or (stage, system)
+        name = tuple(name) if isinstance(name, tuple) else (name,)
+        return name[0], name[1] if len(name) > 1 else None, name[2] if len(name) > 2 else None
+
+    def profile_file(self, name: Hashable) -> Optional[str]:
+        """
+        Return the file for the profile of a job or None if its stage is not profiled.
+        """
+        if self._labels(name)[0] not in self._profile_stages or self._profile_directory is None:
+            return None
+        return os.path.join(self._profile_directory, "-".join(str(part) for part in name) + ".prof")
+
+    def job(self, name: Hashable, local: bool, metrics: Dict[str, Any], running: int, queue_depth: int):
+        stage, system, lambd = self._labels(name)
+        if not local:
+            self._worker_time += metrics["wall"]
+        self._write({
+            "event": "job",
+            "time": time.perf_counter() - self._start,
+            "stage": stage,
+            "system": system,
+            "lambda": lambd,
+            "job": list(name) if isinstance(name, tuple) else name,
+            "local": local,
+            "running": running,
+            "queue_depth": queue_depth,
+            **metrics,
+        })
+        totals = self._stages.setdefault((stage, system, lambd), {"jobs": 0, "wall": 0.0, "cpu": 0.0, "max_rss": None, "counts": {}})
+        totals["jobs"] += 1
+        totals["wall"] += metrics["wall"]
+        totals["cpu"] += metrics["cpu"]
+        if metrics["max_rss"] is not None:
+            totals["max_rss"] = max(totals["max_rss"] or 0, metrics["max_rss"])
+        for key, value in metrics["counts"].items():
+            totals["counts"][key] = totals["counts"].get(key, 0) + value
+
+    def finish(self):
+        elapsed: float = time.perf_counter() - self._start
+        stages: List[Dict[str, Any]] = []
+        for (stage, system, lambd), totals in self._stages.items():
+            stages.append(dict({"stage": stage, "system": system, "lambda": lambd}, **totals))
+        self._write({
+            "event": "summary",
+            "elapsed": elapsed,
+            "workers": self._workers,
+            # the fraction of the time the worker processes were busy
+            "utilization": self._worker_time / (elapsed * self._workers) if self._workers and elapsed > 0 else None,
+            # the peak of the scheduling process (the jobs' peaks are recorded per stage)
+            "max_rss": lifetime_peak_rss(),
+            "stages": stages,
+        })
+        self._file.close()
+
+    def _write(self, event: Dict[str, Any]):
+        print(json.dumps(event, default=str), file=self._file)
+        self._file.flush()
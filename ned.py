@@ -3,46 +3,109 @@
 # Licensed under the EUPL
 
 import bisect
-import ctypes
 import datetime
-import functools
 import gc
+import hashlib
+import itertools
+import json
 import math
+import mmap
 import multiprocessing
-import multiprocessing.sharedctypes
+import os
 import random
+import shutil
 import socket
 import sys
-from typing import Iterable, List, MutableSequence, Optional, Set, Tuple, Union
+import tempfile
+import time
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
-import settings
-from databasehandler import DatabaseHandler, Message, System
+import numpy
 
-# a shared memory ctypes array to hold the complete system output including dummy messages
-output_messages_shared: MutableSequence[int] = []
-output_ia_times_shared: MutableSequence[int] = []
+from cache import ArtifactCache
+from checkpoint import Checkpoint, RunCheckpoints
+from config import Config
+from databasehandler import DatabaseHandler, System
+import instrumentation
+from instrumentation import Tracer
+from results import ResultsSink, read_results
+from scheduler import Job, Scheduler
 
+# minimum time between two progress reports of long-running stages (in seconds)
+PROGRESS_INTERVAL = 10
 
-def compute_ned_dummies(chunk_genuine: List[int], system_id: Union[str, int], chunk_lambda: float):
+# number of items processed at once when streaming a system output (e.g. deriving its IA times or hashing it)
+MERGE_BLOCK_SIZE = 1 << 22
+
+
+def random_seed(config: Config, *key: Any) -> Optional[int]:
+    """
+    Return the seed of the random substream identified by key (e.g. the stage, system, lambda and chunk), derived from
+    config.seed, or None if no seed is configured. Every part of the evaluation draws from its own substream, so the
+    results of a seeded run do not depend on the number of workers or the order in which they pick up jobs.
+    """
+    if config.seed is None:
+        return None
+    digest = hashlib.sha256(json.dumps([config.seed] + list(key), default=str).encode()).digest()
+    return int.from_bytes(digest[0:16], "little")
+
+
+def compute_ned_dummies(chunk_genuine: Union[List[int], numpy.ndarray], system_id: Union[str, int], chunk_lambda: float, config: Config, seed: Optional[int] = None):
+    # the reference implementation works on Python ints
+    if config.dummy_backend == "python" or chunk_lambda < 0:
+        chunk_genuine = numpy.asarray(chunk_genuine).tolist()
     # if chunk_lambda is negative, do not generate any dummy traffic and just return the indentical list
     if chunk_lambda < 0:
         return chunk_genuine[0:-1]
+    if config.dummy_backend == "python":
+        chunk_output = compute_ned_dummies_python(chunk_genuine, system_id, chunk_lambda, config, seed)
+    else:
+        chunk_output = compute_ned_dummies_numpy(chunk_genuine, system_id, chunk_lambda, config, seed).tolist()
+    instrumentation.count("dummies", len(chunk_output) - (len(chunk_genuine) - 1))
+    return chunk_output
+
+
+def generate_output_chunk(store_directory: str, chunk_parameters: List[Tuple[float, Dict[str, Any]]], chunk_genuine: numpy.ndarray, system_id: Union[str, int], config: Config, seed: Optional[int] = None, sweep: Optional[List[float]] = None):
+    """
+    Generate the dummy traffic of a chunk for one or (in sweep mode, see compute_ned_dummies_sweep) several lambdas and
+    store every output as a "chunk" artifact with the given parameters, so the outputs are written to disk by the
+    workers instead of being sent back to the scheduling process.
+    If a seed is given, the output only depends on the seed (see random_seed) and, in sweep mode, on all lambdas of the
+    sweep, even if only some of their outputs are generated.
+    """
+    store = ArtifactCache(store_directory)
+    lambdas: List[float] = [lambd for lambd, _ in chunk_parameters]
+    if config.dummy_backend == "python":
+        outputs: List[numpy.ndarray] = [numpy.asarray(compute_ned_dummies(chunk_genuine, system_id, lambd, config, seed), dtype=numpy.int64) for lambd in lambdas]
+    else:
+        outputs = compute_ned_dummies_sweep(chunk_genuine, system_id, lambdas, config, seed, sweep)
+        instrumentation.count("dummies", sum(len(output) - (len(chunk_genuine) - 1) for output in outputs))
+    for (_, parameters), output in zip(chunk_parameters, outputs):
+        store.store("chunk", parameters, output, evict=False)
+
+
+def compute_ned_dummies_python(chunk_genuine: List[int], system_id: Union[str, int], chunk_lambda: float, config: Config, seed: Optional[int] = None):
+    """
+    Reference implementation drawing one dummy at a time.
+    """
+    # without a seed, use the random module's global generator
+    rng: Any = random if seed is None else random.Random(seed)
     chunk_output: List[int] = [chunk_genuine[0]]
     # change lambda's magnitude to match that of the system's timestamps
-    chunk_lambda *= settings.TIMESTAMP_PRECISION[system_id]
+    chunk_lambda *= config.timestamp_precision[system_id]
     # i is the index of the previous genuine message
     for i in range(len(chunk_genuine)-1):
         last: int = chunk_genuine[i]
         next_genuine: int = chunk_genuine[i+1]
         # check for outage
-        if next_genuine - last > settings.INTERARRIVAL_THRESHOLDS[system_id]:
+        if next_genuine - last > config.interarrival_thresholds[system_id]:
             # if outage is encountered, just skip the time between these messages
             chunk_output.append(next_genuine)
             continue
         # generate dummies until the next genuine message appears
         next_dummy: int = last
         while True:
-            ned_draw = math.floor(random.expovariate(chunk_lambda))
+            ned_draw = math.floor(rng.expovariate(chunk_lambda))
             next_dummy += ned_draw
             if next_dummy >= next_genuine:
                 break
@@ -52,334 +115,1581 @@ def compute_ned_dummies(chunk_genuine: List[int], system_id: Union[str, int], ch
     return chunk_output[0:-1]
 
 
-def compute_matches(system_id: Union[str, int], sample: List[int], all_interactions: List[int]):
+def compute_ned_dummies_numpy(chunk_genuine: List[int], system_id: Union[str, int], chunk_lambda: float, config: Config, seed: Optional[int] = None) -> numpy.ndarray:
+    """
+    Batched implementation of compute_ned_dummies.
+    For every gap between two genuine messages, a block of floored exponential draws is generated at once. The block
+    size is chosen such that the cumulative sum exceeds the gap with very high probability; the rare gaps that are not
+    filled by their block are topped up afterwards. The result has the same semantics as the reference implementation:
+    each draw is floored before it is added to the previous timestamp.
+    """
+    return compute_ned_dummies_sweep(chunk_genuine, system_id, [chunk_lambda], config, seed)[0]
+
+
+def compute_ned_dummies_sweep(chunk_genuine: Union[List[int], numpy.ndarray], system_id: Union[str, int], lambdas: List[float], config: Config, seed: Optional[int] = None, sweep: Optional[List[float]] = None) -> List[numpy.ndarray]:
+    """
+    Generate the dummy traffic of a chunk for several values of lambda from the same random numbers (see
+    compute_ned_dummies_numpy for the generation of a single output).
+    Every draw is a unit-rate exponential draw U scaled by 1/lambda, i.e. floor(U / lambda), which has the same
+    distribution as a draw for lambda alone. Since floor(U / lambda) grows as lambda decreases, blocks sized for the
+    largest lambda reach the next genuine message for all other values as well, so the random numbers are drawn once.
+    Smaller values of lambda only process the prefix of every block they are likely to need (and the rest of the block
+    only where that does not suffice), so the cost grows with the size of the outputs rather than the number of lambdas.
+    The outputs for neighbouring values of lambda are strongly correlated, which makes their results vary smoothly.
+    Only the rare gaps which have to be topped up use separate random numbers per lambda.
+    The random numbers are drawn for all values of sweep (by default, lambdas), of which lambdas may be a subset, so the
+    output for a lambda does not depend on which other outputs are generated along with it.
+    Returns the output for every lambda (the genuine messages for negative values).
+    """
+    if sweep is None:
+        sweep = lambdas
+    seed_sequence = numpy.random.SeedSequence(seed)
+    rng = numpy.random.default_rng(seed_sequence)
+    # every lambda of the sweep tops up gaps from its own substream
+    top_up_seeds: List[numpy.random.SeedSequence] = seed_sequence.spawn(len(sweep))
+    genuine = numpy.asarray(chunk_genuine, dtype=numpy.int64)
+    outputs: List[numpy.ndarray] = [genuine[0:-1] if lambd < 0 else genuine[0:0] for lambd in lambdas]
+    positive: List[int] = [j for j, lambd in enumerate(lambdas) if lambd >= 0]
+    if len(genuine) < 2 or not positive:
+        return outputs
+    gaps = numpy.diff(genuine)
+    # outages do not get any dummies
+    in_outage = gaps > config.interarrival_thresholds[system_id]
+
+    def sizes_for(lambd: float) -> numpy.ndarray:
+        # floor(X) for X ~ Exp(lambda) is geometrically distributed; use its mean and variance to size the blocks
+        draw_mean = 1 / math.expm1(lambd)
+        draw_variance = math.exp(-lambd) / (-math.expm1(-lambd)) ** 2
+        expected_draws = gaps / draw_mean
+        sizes = numpy.ceil(expected_draws + 6 * numpy.sqrt(gaps * draw_variance / draw_mean ** 3) + 16).astype(numpy.int64)
+        sizes[in_outage] = 0
+        # every gap starts with a 0 "draw" which represents the genuine message itself
+        return sizes + 1
+
+    # change lambda's magnitude to match that of the system's timestamps
+    block_sizes = sizes_for(max(sweep) * config.timestamp_precision[system_id])
+    block_ends = numpy.cumsum(block_sizes)
+    block_starts = block_ends - block_sizes
+    units = rng.standard_exponential(int(block_ends[-1]))
+    for j in positive:
+        chunk_lambda: float = lambdas[j] * config.timestamp_precision[system_id]
+        top_up_rng = numpy.random.default_rng(top_up_seeds[sweep.index(lambdas[j])])
+        # smaller values of lambda need fewer draws per gap, so only a prefix of every block is processed
+        prefix_sizes = numpy.minimum(sizes_for(chunk_lambda), block_sizes)
+        prefix_ends = numpy.cumsum(prefix_sizes)
+        prefix_starts = prefix_ends - prefix_sizes
+        if numpy.array_equal(prefix_sizes, block_sizes):
+            prefix_units = units
+        else:
+            prefix_units = units[numpy.repeat(block_starts - prefix_starts, prefix_sizes) + numpy.arange(int(prefix_ends[-1]))]
+        draws = numpy.floor(prefix_units / chunk_lambda).astype(numpy.int64)
+        del prefix_units
+        draws[prefix_starts] = 0
+        # cumulative sum per block
+        offsets = numpy.cumsum(draws)
+        del draws
+        offsets -= numpy.repeat(offsets[prefix_starts], prefix_sizes)
+        # keep the genuine message and all dummies before the next genuine message
+        keep = offsets < numpy.repeat(gaps, prefix_sizes)
+        keep[prefix_starts] = True
+        chunk_output = numpy.repeat(genuine[:-1], prefix_sizes) + offsets
+        # prefixes whose draws did not reach the next genuine message continue with the rest of their block, blocks
+        # which did not reach it need more dummies
+        unfilled = numpy.flatnonzero(~in_outage & (offsets[prefix_ends - 1] < gaps))
+        kept_ends = numpy.cumsum(keep)[prefix_ends - 1]
+        chunk_output = chunk_output[keep]
+        del offsets, keep
+        if len(unfilled) > 0:
+            insert_positions: List[int] = []
+            insert_values: List[int] = []
+            for i in unfilled:
+                next_dummy = int(chunk_output[kept_ends[i] - 1])
+                next_genuine = int(genuine[i+1])
+                remaining = iter(units[block_starts[i]+prefix_sizes[i]:block_ends[i]].tolist())
+                while True:
+                    unit: Optional[float] = next(remaining, None)
+                    next_dummy += int(math.floor(top_up_rng.exponential(1 / chunk_lambda) if unit is None else unit / chunk_lambda))
+                    if next_dummy >= next_genuine:
+                        break
+                    insert_positions.append(int(kept_ends[i]))
+                    insert_values.append(next_dummy)
+            chunk_output = numpy.insert(chunk_output, insert_positions, insert_values)
+        outputs[j] = chunk_output
+    return outputs
+
+
+def share_array(array: numpy.memmap) -> Tuple[Any, ...]:
+    """
+    Describe an array memory-mapped from a file (e.g. from the artifact store), so that other processes can map the
+    same file instead of receiving a copy.
+    """
+    if not (isinstance(array, numpy.memmap) and isinstance(array.base, mmap.mmap)):
+        raise ValueError("Only arrays memory-mapped from a file can be shared")
+    return array.filename, array.offset, array.shape, array.dtype.str
+
+
+def attach_array(description: Tuple[Any, ...]) -> numpy.memmap:
+    filename, offset, shape, dtype = description
+    return numpy.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+
+class InterArrivalIndex:
+    """
+    Index over the inter-arrival times of a system's output, built once per output stream and sample duration.
+    Output positions are sorted lexicographically by the first ia_index_depth inter-arrival times following them (a truncated
+    suffix array), so all positions whose IA times start with a given sequence form a contiguous range that can be found
+    by binary search. The suffix array only depends on the output, so it is shared by all sample durations (see
+    build_suffix_array). Empty and single-message samples are answered from precomputed histograms, which depend on
+    the sample duration.
+    """
+    # the arrays computed from the system output, shared by all sample durations
+    _SUFFIX_ARRAYS = ["_ia_padded", "_positions"]
+    # the arrays computed for one sample duration
+    _DURATION_ARRAYS = ["interactions", "single_ia_task", "single_ia_notask"]
+    _STORED_ARRAYS = _DURATION_ARRAYS + _SUFFIX_ARRAYS
+
+    def __init__(self, output_messages: numpy.ndarray, output_ia_times: numpy.ndarray, interactions: List[int], system_id: Union[str, int], sample_duration: int, config: Config, suffix_array: Optional[Tuple[numpy.ndarray, numpy.ndarray]] = None):
+        """
+        Parameters:
+            suffix_array The result of build_suffix_array for the output; computed if not given
+        """
+        self.output_messages = output_messages
+        self.output_ia_times = output_ia_times
+        self.interactions = numpy.sort(numpy.asarray(interactions, dtype=numpy.int64))
+        self.sample_duration = sample_duration
+        self.depth: int = config.ia_index_depth
+        threshold: int = config.interarrival_thresholds[system_id]
+        # empty samples: count the sample start times within each IA time which do not see a message
+        no_outage = output_ia_times[output_ia_times <= threshold]
+        self.empty_matches_notask: int = int(numpy.sum(numpy.maximum(no_outage - sample_duration, 0)))
+        # single-message samples: the IA time before the message has to be longer than the sample's first IA time
+        i = numpy.arange(1, len(output_ia_times))
+        i = i[(output_ia_times[i] <= threshold) & (output_ia_times[i-1] <= threshold) & (output_ia_times[i] > sample_duration)]
+        insert_p = numpy.searchsorted(self.interactions, output_messages[i])
+        is_task = self.interactions[numpy.minimum(insert_p, len(self.interactions) - 1)] == output_messages[i] if len(self.interactions) > 0 else numpy.zeros(len(i), dtype=bool)
+        self.single_ia_task = numpy.sort(output_ia_times[i[is_task] - 1])
+        self.single_ia_notask = numpy.sort(output_ia_times[i[~is_task] - 1])
+        del i, insert_p, is_task
+        # multi-message samples
+        self._ia_padded, self._positions = suffix_array if suffix_array is not None else self.build_suffix_array(output_ia_times, self.depth)
+
+    @staticmethod
+    def build_suffix_array(output_ia_times: numpy.ndarray, depth: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Sort the output positions by the depth IA times following them.
+        Returns the IA times padded so that every position has depth successors (-1 never matches) and the sorted
+        positions.
+        """
+        ia_padded = numpy.concatenate([output_ia_times, numpy.full(depth, -1, dtype=numpy.int64)])
+        columns = [ia_padded[1+j:len(output_ia_times)+j] for j in range(depth)]
+        # numpy.lexsort uses the last key as the primary key
+        return ia_padded, numpy.lexsort(columns[::-1]) + 1
+
+    @classmethod
+    def save_suffix_array(cls, store: ArtifactCache, parameters: Dict[str, Any], suffix_array: Tuple[numpy.ndarray, numpy.ndarray]):
+        """
+        Write a suffix array (see build_suffix_array) to the store.
+        """
+        for name, array in zip(cls._SUFFIX_ARRAYS, suffix_array):
+            store.store("index", dict(parameters, array=name), array, evict=False)
+
+    @classmethod
+    def load_suffix_array(cls, store: ArtifactCache, parameters: Dict[str, Any]) -> Optional[Tuple[numpy.ndarray, numpy.ndarray]]:
+        """
+        Load a suffix array written by save_suffix_array, or return None if it is not in the store.
+        """
+        arrays = [store.load("index", dict(parameters, array=name)) for name in cls._SUFFIX_ARRAYS]
+        if any(array is None for array in arrays):
+            return None
+        return arrays[0], arrays[1]
+
+    def save(self, store: ArtifactCache, suffix_parameters: Dict[str, Any], parameters: Dict[str, Any]):
+        """
+        Write the index to the store, so that it can be shared with other processes (see handle) and loaded again. The
+        suffix array is written under suffix_parameters (unless it is stored already), the rest under parameters.
+        """
+        suffix_array = self.load_suffix_array(store, suffix_parameters)
+        if suffix_array is None:
+            self.save_suffix_array(store, suffix_parameters, (self._ia_padded, self._positions))
+            suffix_array = self.load_suffix_array(store, suffix_parameters)
+        self._ia_padded, self._positions = suffix_array
+        for name in self._DURATION_ARRAYS:
+            setattr(self, name, store.store("index", dict(parameters, array=name), getattr(self, name), evict=False))
+        store.store("index", dict(parameters, array="scalars"), numpy.array([self.sample_duration, self.empty_matches_notask], dtype=numpy.int64), evict=False)
+
+    @classmethod
+    def load(cls, store: ArtifactCache, suffix_parameters: Dict[str, Any], parameters: Dict[str, Any], output_messages: numpy.ndarray, output_ia_times: numpy.ndarray) -> Optional["InterArrivalIndex"]:
+        """
+        Load an index written by save, or return None if it is not in the store.
+        """
+        suffix_array = cls.load_suffix_array(store, suffix_parameters)
+        arrays = {name: store.load("index", dict(parameters, array=name)) for name in cls._DURATION_ARRAYS + ["scalars"]}
+        if suffix_array is None or any(array is None for array in arrays.values()):
+            return None
+        index = cls.__new__(cls)
+        index.output_messages = output_messages
+        index.output_ia_times = output_ia_times
+        index.sample_duration, index.empty_matches_notask = (int(value) for value in arrays.pop("scalars"))
+        index.depth = parameters["depth"]
+        for name, array in arrays.items():
+            setattr(index, name, array)
+        index._ia_padded, index._positions = suffix_array
+        return index
+
+    def handle(self) -> Dict[str, Any]:
+        """
+        Return a picklable handle, which worker processes can attach to without copying the index (see attach).
+        All arrays have to be memory-mapped from the store.
+        """
+        handle: Dict[str, Any] = {"sample_duration": self.sample_duration, "empty_matches_notask": self.empty_matches_notask, "depth": self.depth}
+        for name in ["output_messages", "output_ia_times"] + self._STORED_ARRAYS:
+            handle[name] = share_array(getattr(self, name))
+        return handle
+
+    @classmethod
+    def attach(cls, handle: Dict[str, Any]) -> "InterArrivalIndex":
+        index = cls.__new__(cls)
+        index.sample_duration = handle["sample_duration"]
+        index.empty_matches_notask = handle["empty_matches_notask"]
+        index.depth = handle["depth"]
+        for name in ["output_messages", "output_ia_times"] + cls._STORED_ARRAYS:
+            setattr(index, name, attach_array(handle[name]))
+        return index
+
+    def _bound(self, lo: int, hi: int, column: int, value: int, right: bool) -> int:
+        # binary search on the sorted positions, comparing the IA time at the given column
+        while lo < hi:
+            mid = (lo + hi) // 2
+            ia_time = self._ia_padded[self._positions[mid] + column]
+            if ia_time < value or (right and ia_time == value):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def candidates(self, ia_times: List[int]) -> numpy.ndarray:
+        """
+        Return all output positions i such that the IA times starting at i begin with the given IA times.
+        Only the first depth IA times are looked up in the index, the rest is checked on the candidates.
+        """
+        lo, hi = 0, len(self._positions)
+        for column, value in enumerate(ia_times[:self.depth]):
+            lo, hi = self._bound(lo, hi, column, value, False), self._bound(lo, hi, column, value, True)
+            if lo == hi:
+                break
+        positions = numpy.sort(self._positions[lo:hi])
+        for column in range(self.depth, len(ia_times)):
+            if len(positions) == 0:
+                break
+            positions = positions[self._ia_padded[positions + column] == ia_times[column]]
+        return positions
+
+
+# the indices this worker process is attached to, by the file name of their single_ia_task array (the positions array
+# is shared by all sample durations)
+attached_indices: Dict[str, InterArrivalIndex] = {}
+
+
+def compute_matches(index: InterArrivalIndex, sample: List[int]):
     matches_task: int = 0 # number of matches where an interaction was performed
     matches_notask: int = 0 # number of matches where no or a different interaction was performed
-    sample_duration = round(settings.SAMPLE_DURATION / settings.TIMESTAMP_PRECISION[system_id])
+    sample_duration = index.sample_duration
     # if the sample is empty, we "only" need to count the number of empty samples in the output
     if not sample:
-        for ia_time in output_ia_times_shared:
-            if ia_time > settings.INTERARRIVAL_THRESHOLDS[system_id]:
-                continue
-            matches_between: int = ia_time - sample_duration
-            if matches_between > 0:
-                matches_notask += matches_between
+        matches_notask = index.empty_matches_notask
     # if the sample contains a single message, we need to look for IA times > that followed by something > sample_duration
     elif len(sample) == 1:
-        for i in range(1, len(output_ia_times_shared)):
-            if output_ia_times_shared[i] > settings.INTERARRIVAL_THRESHOLDS[system_id]:
-                continue
-            if output_ia_times_shared[i-1] > settings.INTERARRIVAL_THRESHOLDS[system_id]:
-                continue
-            if output_ia_times_shared[i] > sample_duration and output_ia_times_shared[i-1] > sample[0]:
-                insert_p = bisect.bisect_left(all_interactions, output_messages_shared[i])
-                if insert_p < len(all_interactions) and output_messages_shared[i] == all_interactions[insert_p]:
-                    matches_task += 1
-                else:
-                    matches_notask += 1
-    # if the sample contains multiple messages, the IA times of those have to match the IA times in output_ia_times_shared
+        matches_task = len(index.single_ia_task) - int(numpy.searchsorted(index.single_ia_task, sample[0], side="right"))
+        matches_notask = len(index.single_ia_notask) - int(numpy.searchsorted(index.single_ia_notask, sample[0], side="right"))
+    # if the sample contains multiple messages, the IA times of those have to match the IA times in the output
     else:
-        i = 0
+        # positions whose following IA times match the rest of the sample
+        i = index.candidates(sample[1:])
+        i = i[i < len(index.output_ia_times) - len(sample) + 1]
+        # check if the IA time before the first message matches
+        i = i[index.output_ia_times[i-1] > sample[0]]
+        # check if next message would still be within sample_duration
+        i = i[index.output_messages[i+len(sample)] - index.output_messages[i] > sample_duration]
+        # determine whether the sample contains a task
+        task = numpy.searchsorted(index.interactions, index.output_messages[i]) != numpy.searchsorted(index.interactions, index.output_messages[i] + sample_duration)
+        matches_task = int(numpy.count_nonzero(task))
+        matches_notask = len(i) - matches_task
+    #print("\nReturning matches_task = {} and matches_notask = {} for sample {}".format(matches_task, matches_notask, sample))
+    return matches_task, matches_notask
+
+
+def compute_matches_batch(handle: Dict[str, Any], samples: List[List[int]]) -> List[Tuple[int, int]]:
+    key: str = handle["single_ia_task"][0]
+    if key not in attached_indices:
+        # different systems and lambdas are evaluated concurrently, keep a few indices attached
+        if len(attached_indices) >= 4:
+            del attached_indices[next(iter(attached_indices))]
+        attached_indices[key] = InterArrivalIndex.attach(handle)
+    index = attached_indices[key]
+    instrumentation.count("compute_matches", len(samples))
+    return [compute_matches(index, sample) for sample in samples]
+
+
+def _combine_intervals(a: Tuple[numpy.ndarray, numpy.ndarray], b: Tuple[numpy.ndarray, numpy.ndarray], keep: Callable[[numpy.ndarray, numpy.ndarray], numpy.ndarray]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Combine two sets of integers given as intervals [from, to] sorted by both ends (e.g. their union or difference).
+    keep decides for each elementary interval whether it is kept, given whether it lies in a and whether it lies in b.
+    Returns the resulting intervals, merged where they touch.
+    """
+    # half-open boundaries of the elementary intervals
+    points = numpy.unique(numpy.concatenate([a[0], a[1] + 1, b[0], b[1] + 1]))
+    if len(points) < 2:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+    starts, ends = points[:-1], points[1:]
+
+    def contains(intervals: Tuple[numpy.ndarray, numpy.ndarray], t: numpy.ndarray) -> numpy.ndarray:
+        k = numpy.searchsorted(intervals[0], t, side="right") - 1
+        return (k >= 0) & (t <= intervals[1][numpy.maximum(k, 0)]) if len(intervals[0]) > 0 else numpy.zeros(len(t), dtype=bool)
+    kept = keep(contains(a, starts), contains(b, starts))
+    starts, ends = starts[kept], ends[kept]
+    if len(starts) == 0:
+        return starts, ends
+    # merge touching intervals
+    new_interval = numpy.concatenate([[True], starts[1:] != ends[:-1]])
+    return starts[new_interval], ends[numpy.concatenate([new_interval[1:], [True]])] - 1
+
+
+class SampleStartIndex:
+    """
+    The valid sample start times of a system output, i.e. those for which neither the start nor the end of the sample
+    lies in an outage, split into task start times (an interaction happens within [s, s + sample_duration]) and no-task
+    start times. Both are stored as sorted intervals with cumulative lengths, so start times can be drawn uniformly from
+    either set (or both) without rejection.
+    """
+    def __init__(self, output_messages: numpy.ndarray, output_ia_times: numpy.ndarray, user_interactions: numpy.ndarray, system_id: Union[str, int], from_ts: int, to_ts: int, sample_duration: int, config: Config):
+        # a time x lies in the outage before message p if output_messages[p-1] < x <= output_messages[p]
+        outages = numpy.flatnonzero(output_ia_times > config.interarrival_thresholds[system_id])
+        outage_from = output_messages[outages] + 1
+        outage_to = output_messages[outages + 1]
+        # start times whose start or end lies in an outage
+        invalid = _combine_intervals((outage_from, outage_to), (outage_from - sample_duration, outage_to - sample_duration), numpy.logical_or)
+        valid = _combine_intervals((numpy.array([from_ts + 1]), numpy.array([to_ts - sample_duration])), invalid, lambda in_range, in_invalid: in_range & ~in_invalid)
+        # start times containing an interaction form a union of intervals [x - sample_duration, x]
+        interactions = numpy.unique(numpy.asarray(user_interactions, dtype=numpy.int64))
+        task = _combine_intervals((interactions - sample_duration, interactions), (interactions[0:0], interactions[0:0]), lambda in_task, _: in_task)
+        self.task = _combine_intervals(valid, task, numpy.logical_and)
+        self.notask = _combine_intervals(valid, task, lambda in_valid, in_task: in_valid & ~in_task)
+        self.task_before = numpy.concatenate([[0], numpy.cumsum(self.task[1] - self.task[0] + 1)])
+        self.notask_before = numpy.concatenate([[0], numpy.cumsum(self.notask[1] - self.notask[0] + 1)])
+
+    @property
+    def task_count(self) -> int:
+        return int(self.task_before[-1])
+
+    @property
+    def notask_count(self) -> int:
+        return int(self.notask_before[-1])
+
+    def draw(self, rng: Any, task: bool = True, notask: bool = True) -> Optional[Tuple[int, bool]]:
         """
-        The following loop uses a layered check to boost performance. The first
-        check is fast to compute and already fails for many elements. Later
-        checks are harder to compute and are therefore only executed if the sample
-        is likely to match
+        Draw a start time uniformly from the task start times, the no-task start times or both, using rng (the random
+        module or a random.Random).
+        Returns the start time and whether it is a task start time, or None if there is no such start time.
         """
-        while i < len(output_ia_times_shared) - len(sample):
-            # go to the next distinct timestamp
-            if output_ia_times_shared[i] == 0:
-                while i < len(output_ia_times_shared) and output_ia_times_shared[i] == 0:
-                    i += 1
-            else:
-                i += 1
-            # check if first message matches
-            if output_ia_times_shared[i-1] <= sample[0]:
-                continue
-            # check if sample matches
-            match = True
-            for j in range(1, len(sample)):
-                if output_ia_times_shared[i+j-1] != sample[j]:
-                    match = False
+        total: int = (self.task_count if task else 0) + (self.notask_count if notask else 0)
+        if total == 0:
+            return None
+        r: int = rng.randrange(total)
+        is_task: bool = task and r < self.task_count
+        if is_task:
+            intervals, before = self.task, self.task_before
+        else:
+            r -= self.task_count if task else 0
+            intervals, before = self.notask, self.notask_before
+        k = int(numpy.searchsorted(before, r, side="right")) - 1
+        return int(intervals[0][k]) + r - int(before[k]), is_task
+
+
+def draw_samples(output_messages: numpy.ndarray, output_ia_times: numpy.ndarray, user_interactions: numpy.ndarray, system_id: Union[str, int], from_ts: int, to_ts: int, sample_duration: int, samples_drawn: Dict[str, int], config: Config, seed: Optional[int] = None) -> Generator[List[int], None, str]:
+    """
+    Draw random samples until config.sample_count samples are drawn, config.sample_timeout is reached or there are no
+    start times left to draw from. The generator returns the reason it stopped: "sample count", "timeout" or
+    "exhausted" (there are no start times of the kind still needed, e.g. no task start times at all).
+    Start times close to or inside an outage are never drawn (see SampleStartIndex); once there are too many task or
+    no-task samples, start times are only drawn from the other kind. Samples which have been drawn before are skipped.
+    samples_drawn["task"] and samples_drawn["notask"] count the drawn samples.
+    The arrays are only accessed where samples are drawn, so they can be memory-mapped. If a seed is given, the sample
+    start times are drawn from a generator with that seed instead of the random module's global generator.
+    """
+    rng: Any = random if seed is None else random.Random(seed)
+    computation_start: datetime.datetime = datetime.datetime.now()
+    # start times are drawn from the valid task and no-task start times directly instead of rejecting invalid ones
+    starts = SampleStartIndex(output_messages, output_ia_times, user_interactions, system_id, from_ts, to_ts, sample_duration, config)
+    # keep track of which samples we already checked; make sure we don't check a sample twice (e.g. an empty one)
+    samples_checked: Set[Tuple[int]] = set()
+    # collect sample_count samples, but use a timeout in case we don't get the number we want
+    while samples_drawn["task"] + samples_drawn["notask"] < config.sample_count and (datetime.datetime.now() - computation_start).total_seconds() < config.sample_timeout:
+        # generate a sample start time; if we already have too many task or non-task samples, only draw from the other
+        drawn: Optional[Tuple[int, bool]] = starts.draw(
+            rng,
+            task=samples_drawn["task"] <= 1.5 * samples_drawn["notask"] + 900,
+            notask=samples_drawn["notask"] <= 1.5 * samples_drawn["task"] + 900
+        )
+        if drawn is None:
+            # there are no start times left to draw from
+            return "exhausted"
+        sample_start_time, task = drawn
+        # collect garbage from time to time
+        if sample_start_time % 100 == 0:
+            gc.collect()
+        # assemble the sample: the IA times up to the first one longer than the sample duration
+        sample: List[int] = []
+        start: int = int(numpy.searchsorted(output_messages, sample_start_time))
+        if start < len(output_messages) and output_messages[start] - sample_start_time <= sample_duration:
+            end: int = start + 1
+            block: int = 64
+            while end < len(output_messages):
+                longer = numpy.flatnonzero(output_ia_times[end-1:end-1+block] > sample_duration)
+                if len(longer) > 0:
+                    end += int(longer[0])
                     break
-            if not match:
-                continue
-            #if output_ia_times_shared[i:i+len(sample)-1] != sample[1:]:
-            #    continue
-            # check if next message would still be within sample_duration
-            if output_messages_shared[i+len(sample)] - output_messages_shared[i] <= sample_duration:
-                continue
-            task: bool = False
-            # determine whether the sample contains a task
-            if bisect.bisect_left(all_interactions, output_messages[i]) != bisect.bisect_left(all_interactions, output_messages[i] + sample_duration):
-                matches_task += 1
+                end = min(end + block, len(output_messages))
+                block *= 2
+            sample = [int(output_messages[start]) - sample_start_time] + output_ia_times[start:end-1].tolist()
+        del start
+        # check if we already had this sample
+        sample_tuple = tuple(sample)
+        if sample_tuple in samples_checked:
+            instrumentation.count("rejected_duplicate")
+            del sample, sample_start_time, sample_tuple, task
+            continue
+        samples_checked.add(sample_tuple)
+        del sample_tuple
+        if task:
+            samples_drawn["task"] += 1
+        else:
+            samples_drawn["notask"] += 1
+        del sample_start_time, task
+        instrumentation.count("samples_delegated")
+        yield sample
+    return "sample count" if samples_drawn["task"] + samples_drawn["notask"] >= config.sample_count else "timeout"
+
+
+def array_checksum(array: numpy.ndarray) -> str:
+    """
+    Return the SHA-256 hash of an array's data, hashed block by block so the array need not be copied at once.
+    """
+    digest = hashlib.sha256()
+    for i in range(0, len(array), MERGE_BLOCK_SIZE):
+        digest.update(numpy.ascontiguousarray(array[i:i+MERGE_BLOCK_SIZE]).tobytes())
+    return digest.hexdigest()
+
+
+def batched(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _hash_ranges(values: numpy.ndarray, starts: numpy.ndarray, ends: numpy.ndarray, base: int) -> numpy.ndarray:
+    """
+    Polynomial hash (modulo 2^64) of values[starts[k]:ends[k]] for all k.
+    """
+    powers = numpy.full(len(values) + 1, base, dtype=numpy.uint64)
+    powers[0] = 1
+    powers = numpy.cumprod(powers, dtype=numpy.uint64)
+    inverse_powers = numpy.full(len(values) + 1, pow(base, -1, 2**64), dtype=numpy.uint64)
+    inverse_powers[0] = 1
+    inverse_powers = numpy.cumprod(inverse_powers, dtype=numpy.uint64)
+    prefix = numpy.concatenate([numpy.zeros(1, dtype=numpy.uint64), numpy.cumsum(values.astype(numpy.uint64) * powers[:-1], dtype=numpy.uint64)])
+    return (prefix[ends] - prefix[starts]) * inverse_powers[starts]
+
+
+def estimate_exact(output_messages: numpy.ndarray, output_ia_times: numpy.ndarray, interactions: List[int], system_id: Union[str, int], from_ts: int, to_ts: int, sample_duration: int, config: Config) -> Tuple[float, float, int, int]:
+    """
+    Compute epsilon and delta over all possible sample start times instead of a random subset.
+    A sample starting at s consists of the time to the first message at or after s followed by all IA times until one
+    exceeds sample_duration. For a fixed first message p, the IA times (the "tail") are fixed and only the first value
+    d0 = output_messages[p] - s varies. Positions with identical tails are grouped by hashing the tails, and the number
+    of task and no-task start times per (tail, d0) is accumulated in a histogram whose entries are piecewise constant in
+    d0, so it is swept as a sequence of events instead of enumerating every start time.
+    Start times are accepted and classified like the sampling loop does: starts inside or ending in an outage are
+    skipped, and a start is a task if an interaction happens within [s, s + sample_duration].
+    Returns epsilon, delta and the total number of task and no-task start times.
+    """
+    threshold: int = config.interarrival_thresholds[system_id]
+    n = len(output_messages)
+    first_start, last_start = from_ts + 1, to_ts - sample_duration
+    # start times containing an interaction form a union of intervals [x - sample_duration, x]
+    interactions_sorted = numpy.unique(numpy.asarray(interactions, dtype=numpy.int64))
+    if len(interactions_sorted) > 0:
+        new_interval = numpy.concatenate([[True], interactions_sorted[1:] - sample_duration > interactions_sorted[:-1] + 1])
+        task_from = interactions_sorted[new_interval] - sample_duration
+        task_to = interactions_sorted[numpy.concatenate([new_interval[1:], [True]])]
+    else:
+        task_from = task_to = numpy.zeros(0, dtype=numpy.int64)
+    task_before = numpy.concatenate([[0], numpy.cumsum(task_to - task_from + 1)])
+
+    def task_starts(lo: numpy.ndarray, hi: numpy.ndarray) -> numpy.ndarray:
+        # number of task start times within [lo, hi]
+        def covered(t: numpy.ndarray) -> numpy.ndarray:
+            k = numpy.searchsorted(task_from, t, side="right")
+            partial = numpy.minimum(t, task_to[numpy.maximum(k - 1, 0)]) - task_from[numpy.maximum(k - 1, 0)] + 1
+            return task_before[numpy.maximum(k - 1, 0)] + numpy.where(k > 0, partial, 0)
+        if len(task_from) == 0:
+            return numpy.zeros(len(lo), dtype=numpy.int64)
+        return numpy.where(hi >= lo, covered(hi) - covered(lo - 1), 0)
+
+    # start times s with output_messages[p-1] < s <= output_messages[p]; the gap before p must not be an outage
+    p = numpy.arange(1, n)
+    p = p[output_ia_times[p-1] <= threshold]
+    # the sample ends with the first IA time exceeding sample_duration after p
+    breaks = numpy.append(numpy.flatnonzero(output_ia_times > sample_duration), len(output_ia_times))
+    run_end = breaks[numpy.searchsorted(breaks, p)]
+    # non-empty samples: 0 <= d0 <= sample_duration
+    d0_lo = numpy.maximum(0, output_messages[p] - last_start)
+    d0_hi = numpy.minimum.reduce([output_ia_times[p-1] - 1, numpy.full(len(p), sample_duration), output_messages[p] - first_start])
+    # if the sample is followed by an outage, its end must not reach into the outage
+    followed_by_outage = run_end < len(output_ia_times)
+    followed_by_outage[followed_by_outage] = output_ia_times[run_end[followed_by_outage]] > threshold
+    d0_lo = numpy.where(followed_by_outage, numpy.maximum(d0_lo, output_messages[p] + sample_duration - output_messages[numpy.minimum(run_end, n - 1)]), d0_lo)
+    valid = d0_lo <= d0_hi
+    p, run_end, d0_lo, d0_hi = p[valid], run_end[valid], d0_lo[valid], d0_hi[valid]
+    # empty samples: s lies more than sample_duration before the next message, or after the last message
+    gap_end = numpy.flatnonzero(output_ia_times <= threshold) + 1
+    empty_lo = numpy.append(numpy.maximum(output_messages[gap_end - 1] + 1, first_start), max(int(output_messages[-1]) + 1, first_start))
+    empty_hi = numpy.append(numpy.minimum(output_messages[gap_end] - sample_duration - 1, last_start), last_start)
+    empty_total = int(numpy.sum(numpy.maximum(empty_hi - empty_lo + 1, 0)))
+    empty_task = int(numpy.sum(task_starts(empty_lo, empty_hi)))
+    sample_total = int(numpy.sum(d0_hi - d0_lo + 1))
+    sample_task = int(numpy.sum(task_starts(output_messages[p] - d0_hi, output_messages[p] - d0_lo)))
+    total_task = empty_task + sample_task
+    total_notask = empty_total - empty_task + sample_total - sample_task
+
+    # group positions by their tail (length and two independent hashes)
+    keys = numpy.stack([
+        (run_end - p).astype(numpy.uint64),
+        _hash_ranges(output_ia_times, p, run_end, 0x9E3779B97F4A7C15),
+        _hash_ranges(output_ia_times, p, run_end, 0xC2B2AE3D27D4EB4F),
+    ], axis=1)
+    groups = numpy.unique(keys, axis=0, return_inverse=True)[1].reshape(-1)
+    del keys
+    # events (group, d0, change of task count, change of no-task count); every position's events sum up to zero
+    event_groups = [groups, groups]
+    event_d0 = [d0_lo, d0_hi + 1]
+    event_task = [numpy.zeros(len(p), dtype=numpy.int64)] * 2
+    event_notask = [numpy.ones(len(p), dtype=numpy.int64), -numpy.ones(len(p), dtype=numpy.int64)]
+    # start times of a position are covered by at most two task intervals
+    s_lo, s_hi = output_messages[p] - d0_hi, output_messages[p] - d0_lo
+    k = numpy.searchsorted(task_to, s_lo)
+    for j in (k, k + 1):
+        overlaps = j < len(task_from)
+        overlaps[overlaps] = task_from[j[overlaps]] <= s_hi[overlaps]
+        jj = j[overlaps]
+        task_d0_lo = output_messages[p[overlaps]] - numpy.minimum(task_to[jj], s_hi[overlaps])
+        task_d0_hi = output_messages[p[overlaps]] - numpy.maximum(task_from[jj], s_lo[overlaps])
+        ones = numpy.ones(len(jj), dtype=numpy.int64)
+        event_groups += [groups[overlaps], groups[overlaps]]
+        event_d0 += [task_d0_lo, task_d0_hi + 1]
+        event_task += [ones, -ones]
+        event_notask += [-ones, ones]
+    event_groups = numpy.concatenate(event_groups)
+    event_d0 = numpy.concatenate(event_d0)
+    order = numpy.lexsort([event_d0, event_groups])
+    event_groups, event_d0 = event_groups[order], event_d0[order]
+    count_task = numpy.cumsum(numpy.concatenate(event_task)[order])
+    count_notask = numpy.cumsum(numpy.concatenate(event_notask)[order])
+    del order
+    # the counts after the last event at a (group, d0) hold until the next event
+    last = numpy.ones(len(event_d0), dtype=bool)
+    last[:-1] = (event_groups[1:] != event_groups[:-1]) | (event_d0[1:] != event_d0[:-1])
+    count_task = numpy.concatenate([count_task[last], [empty_task]])
+    count_notask = numpy.concatenate([count_notask[last], [empty_total - empty_task]])
+
+    epsilon: float = 0.0
+    delta: float = 0.0
+    observed = (count_task > 0) | (count_notask > 0)
+    # Pr(O|T) and Pr(O|not(T))
+    prob_1 = count_task[observed] / total_task if total_task > 0 else numpy.zeros(numpy.count_nonzero(observed))
+    prob_2 = count_notask[observed] / total_notask if total_notask > 0 else numpy.zeros(numpy.count_nonzero(observed))
+    # if either probability is 0, we have a delta
+    one_sided = (prob_1 == 0.0) | (prob_2 == 0.0)
+    if numpy.any(one_sided):
+        delta = float(numpy.max(numpy.maximum(prob_1[one_sided], prob_2[one_sided])))
+    if not numpy.all(one_sided):
+        epsilon = float(numpy.max(numpy.log(numpy.maximum(prob_1[~one_sided], prob_2[~one_sided]) / numpy.minimum(prob_1[~one_sided], prob_2[~one_sided]))))
+    return epsilon, delta, total_task, total_notask
+
+
+def get_systems(dbh: DatabaseHandler) -> List[System]:
+    """
+    Return all systems of the database, with system 2 split into systems 2.1 and 2.2.
+    """
+    # split systems, from crdt/stats.py
+    systems: List[System] = list(dbh.systems())
+    sys2 = systems[1]
+    systems[1:2] = [
+        sys2.view("2.1", "System 2.1", to_timestamp=1352588400),
+        sys2.view("2.2", "System 2.2", from_timestamp=1352588400),
+    ]
+    return systems
+
+
+def classify_interactions(dbh: DatabaseHandler, system_id: Union[str, int], config: Config) -> Tuple[numpy.ndarray, Dict[str, Tuple[int, int]]]:
+    """
+    Find the user interactions of a database system: messages with presence information from a device whose
+    description matches one of config.interaction_patterns (SQLite GLOB patterns), or any message with presence
+    information if the system is in config.interaction_systems.
+    The devices are classified once, so the messages are only joined with the ids of the interactive devices.
+    Returns the sorted, distinct timestamps of the interactions as stored in the database and the number of devices and
+    messages each pattern matched (with the key "all devices" for systems in config.interaction_systems).
+    """
+    cursor = dbh.cursor()
+    pattern_devices: Dict[str, numpy.ndarray] = {}
+    for pattern in config.interaction_patterns:
+        pattern_devices[pattern] = numpy.array([row[0] for row in cursor.execute("SELECT device_id FROM devices WHERE description GLOB ?;", (pattern,))], dtype=numpy.int64)
+    all_devices: bool = system_id in config.interaction_systems
+    if all_devices:
+        pattern_devices["all devices"] = numpy.array([row[0] for row in cursor.execute("SELECT device_id FROM devices;")], dtype=numpy.int64)
+    else:
+        # a temporary table works on read-only connections, too
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS interactive_devices (device_id INTEGER PRIMARY KEY);")
+        cursor.execute("DELETE FROM interactive_devices;")
+        cursor.executemany("INSERT OR IGNORE INTO interactive_devices VALUES (?);", ((int(device_id),) for devices in pattern_devices.values() for device_id in devices))
+    cursor.execute("""
+        SELECT messages.message_id, messages.timestamp, sources.device_id
+        FROM
+            messages
+            INNER JOIN sources ON messages.message_id = sources.message_id
+            INNER JOIN devices ON sources.device_id = devices.device_id
+            {}
+            INNER JOIN presence ON messages.message_id = presence.message_id
+        WHERE messages.system_id = ?;
+    """.format("" if all_devices else "INNER JOIN interactive_devices ON sources.device_id = interactive_devices.device_id"), (system_id,))
+    message_ids: List[numpy.ndarray] = []
+    timestamps: List[numpy.ndarray] = []
+    device_ids: List[numpy.ndarray] = []
+    while True:
+        rows = cursor.fetchmany(1000000)
+        if not rows:
+            break
+        message_ids.append(numpy.array([row[0] for row in rows], dtype=numpy.int64))
+        timestamps.append(numpy.array([row[1] for row in rows], dtype=numpy.float64))
+        device_ids.append(numpy.array([row[2] for row in rows], dtype=numpy.int64))
+    all_message_ids = numpy.concatenate(message_ids) if message_ids else numpy.zeros(0, dtype=numpy.int64)
+    all_device_ids = numpy.concatenate(device_ids) if device_ids else numpy.zeros(0, dtype=numpy.int64)
+    matches: Dict[str, Tuple[int, int]] = {}
+    for pattern, devices in pattern_devices.items():
+        matched = numpy.isin(all_device_ids, devices)
+        matches[pattern] = (len(numpy.unique(all_device_ids[matched])), len(numpy.unique(all_message_ids[matched])))
+    return numpy.unique(numpy.concatenate(timestamps)) if timestamps else numpy.zeros(0, dtype=numpy.float64), matches
+
+
+def sweep_lambdas_for(config: Config) -> List[float]:
+    """
+    Return the lambdas whose outputs are generated from the same random numbers: all of them in sweep mode (which the
+    reference implementation does not support), none otherwise.
+    """
+    return [lambd for lambd, _ in config.lambdas] if config.lambda_sweep and config.dummy_backend != "python" else []
+
+
+def genuine_parameters_for(database_fingerprint: str, system_id: Union[str, int], config: Config) -> Dict[str, Any]:
+    """
+    Return the parameters under which the genuine messages of a system are stored (see combine_partitions).
+    """
+    return {
+        "database": database_fingerprint,
+        "system": system_id,
+        "precision": config.timestamp_precision[system_id],
+    }
+
+
+def output_parameters_for(genuine_parameters: Dict[str, Any], system_id: Union[str, int], lambd: float, config: Config) -> Dict[str, Any]:
+    """
+    Return the parameters under which the output of a system for a lambda (and its IA times) are stored.
+    """
+    output_parameters: Dict[str, Any] = dict(
+        genuine_parameters,
+        lambd=lambd,
+        threshold=config.interarrival_thresholds[system_id],
+        backend=config.dummy_backend,
+    )
+    sweep_lambdas: List[float] = sweep_lambdas_for(config)
+    if sweep_lambdas:
+        # outputs of a sweep share their random numbers with the other lambdas of the sweep
+        output_parameters["sweep"] = sweep_lambdas
+    if config.seed is not None:
+        output_parameters["seed"] = config.seed
+    return output_parameters
+
+
+def interactions_parameters(genuine_parameters: Dict[str, Any], config: Config) -> Dict[str, Any]:
+    """
+    Return the parameters under which the user interactions of a system are stored (see classify_interactions).
+    """
+    return dict(genuine_parameters, interaction_patterns=config.interaction_patterns, interaction_systems=config.interaction_systems)
+
+
+def classification_parameters(genuine_parameters: Dict[str, Any], system_id: Union[str, int], config: Config) -> Dict[str, Any]:
+    """
+    Return the parameters under which the interactions of a database system are stored (see classify_stage).
+    Parameters:
+        genuine_parameters The parameters of the genuine messages of one of its (split) systems
+        system_id The id of the system in the database
+    """
+    return {
+        "database": genuine_parameters.get("database"),
+        "system": system_id,
+        "interaction_patterns": config.interaction_patterns,
+        "interaction_systems": config.interaction_systems,
+    }
+
+
+def interactions_in_range(timestamps: numpy.ndarray, system: System, config: Config) -> numpy.ndarray:
+    # views of split systems only contain the interactions within their range
+    lo: int = 0 if system.from_timestamp is None else int(numpy.searchsorted(timestamps, system.from_timestamp))
+    hi: int = len(timestamps) if system.to_timestamp is None else int(numpy.searchsorted(timestamps, system.to_timestamp, side="right"))
+    # numpy.rint rounds half to even, just like round()
+    return numpy.rint(timestamps[lo:hi] / config.timestamp_precision[system.id]).astype(numpy.int64)
+
+
+# The following functions are the stages of the evaluation, which the scheduler runs in the worker processes. They
+# exchange arrays through the artifact store (the cache directory or a temporary directory): genuine messages and user
+# interactions are stored under genuine_parameters, the system output and its IA times under output_parameters.
+
+
+def find_system(database: str, system_id: Union[str, int]) -> System:
+    """
+    Return a system (or split system, see get_systems) of a database, opened read-only.
+    """
+    return [system for system in get_systems(DatabaseHandler(database, read_only=True)) if system.id == system_id][0]
+
+
+def plan_partitions(database: str, system_id: Union[str, int], config: Config) -> List[float]:
+    """
+    Split the messages of a system into partitions of about config.ingest_partition_rows messages.
+    Returns the timestamps at which the partitions start (see DatabaseHandler.partition_bounds).
+    """
+    return find_system(database, system_id).partition_bounds(config.ingest_partition_rows)
+
+
+def read_partition(database: str, store_directory: str, system_id: Union[str, int], genuine_parameters: Dict[str, Any], partition: int, from_timestamp: Optional[float], before_timestamp: Optional[float], config: Config) -> int:
+    """
+    Read the genuine messages of a system with from_timestamp <= timestamp < before_timestamp (None for no limit) into
+    the store as a "partition" artifact. Returns the number of messages.
+    """
+    store = ArtifactCache(store_directory)
+    timestamps = find_system(database, system_id).timestamps_array(config.timestamp_precision[system_id], from_timestamp=from_timestamp, before_timestamp=before_timestamp)
+    store.store("partition", dict(genuine_parameters, partition=partition), timestamps, evict=False)
+    instrumentation.count("rows_read", len(timestamps))
+    return len(timestamps)
+
+
+def combine_partitions(store: ArtifactCache, genuine_parameters: Dict[str, Any], partitions: int) -> numpy.ndarray:
+    """
+    Combine the partitions of a system which read_partition stored into its genuine messages, one partition at a time,
+    and remove them. Returns the genuine messages.
+    """
+    names: List[Dict[str, Any]] = [dict(genuine_parameters, partition=k) for k in range(partitions)]
+    partition_arrays: List[numpy.ndarray] = [store.load("partition", name) for name in names]
+    genuine: numpy.ndarray = store.store_chunks("genuine", genuine_parameters, partition_arrays, sum(len(partition_array) for partition_array in partition_arrays), evict=False)
+    del partition_arrays
+    for name in names:
+        store.remove("partition", name)
+    return genuine
+
+
+def classify_stage(database: str, store_directory: str, system_id: Union[str, int], parameters: Dict[str, Any], config: Config) -> Dict[str, Tuple[int, int]]:
+    """
+    Store the user interactions of a database system (shared by its split systems, see classify_interactions) as an
+    "interaction_timestamps" artifact. Returns the number of devices and messages each pattern matched.
+    """
+    store = ArtifactCache(store_directory)
+    timestamps, matches = classify_interactions(DatabaseHandler(database, read_only=True), system_id, config)
+    store.store("interaction_timestamps", parameters, timestamps, evict=False)
+    instrumentation.count("rows_read", len(timestamps))
+    return matches
+
+
+def read_interactions(database: str, store_directory: str, system_id: Union[str, int], genuine_parameters: Dict[str, Any], config: Config) -> int:
+    """
+    Store the user interactions of a system, taken from the interactions of its database system (which are classified
+    first unless they are stored already). Returns the number of interactions.
+    """
+    store = ArtifactCache(store_directory)
+    system = find_system(database, system_id)
+    parameters: Dict[str, Any] = classification_parameters(genuine_parameters, system.system_id, config)
+    timestamps: Optional[numpy.ndarray] = store.load("interaction_timestamps", parameters)
+    if timestamps is None:
+        classify_stage(database, store_directory, system.system_id, parameters, config)
+        timestamps = store.load("interaction_timestamps", parameters)
+    interactions = interactions_in_range(timestamps, system, config)
+    store.store("interactions", interactions_parameters(genuine_parameters, config), interactions, evict=False)
+    return len(interactions)
+
+
+def count_samples(store_directory: str, genuine_parameters: Dict[str, Any], output_parameters: Dict[str, Any], system_id: Union[str, int], to_ts: int, sample_duration: int, config: Config) -> Tuple[int, int]:
+    """
+    Count the samples of a stored system output (see compute_sample_totals).
+    """
+    store = ArtifactCache(store_directory)
+    output_messages: numpy.ndarray = store.load("output", output_parameters)
+    instrumentation.count("output_messages", len(output_messages))
+    last_report: List[float] = [time.monotonic()]
+
+    def progress(done: int, total: int):
+        # report at most every PROGRESS_INTERVAL seconds
+        if time.monotonic() - last_report[0] >= PROGRESS_INTERVAL:
+            last_report[0] = time.monotonic()
+            print("System {}, lambda {:.6f}: counting samples ({:.0%})".format(system_id, output_parameters["lambd"], done / total))
+    return compute_sample_totals(output_messages, store.load("interactions", interactions_parameters(genuine_parameters, config)), system_id, to_ts, sample_duration, config, progress)
+
+
+def compute_sample_totals(output_messages: numpy.ndarray, user_interactions: numpy.ndarray, system_id: Union[str, int], to_ts: int, sample_duration: int, config: Config, progress: Optional[Callable[[int, int], None]] = None) -> Tuple[int, int]:
+    """
+    Calculate how many samples there are containing interactions and how many there are containing none.
+    This gives the same totals as compute_sample_totals_python, which steps from output position to output position:
+    to the next user interaction if it is close, past an outage or to the end of the current sample. Each step only
+    depends on the current position (the next interaction is the first one after it), so the steps and their
+    contributions to the totals are computed at once for all positions the path can visit: position 0, interactions,
+    the ends of outages and the positions far away from the next interaction (where the path advances one sample at a
+    time) together with their successors. Following the path from position 0 then only requires a lookup per step.
+    Parameters:
+        progress Called from time to time with the current position and the number of output messages
+    """
+    output_messages = numpy.asarray(output_messages, dtype=numpy.int64)
+    interactions = numpy.asarray(user_interactions, dtype=numpy.int64)
+    threshold: int = config.interarrival_thresholds[system_id]
+    n: int = len(output_messages)
+    if n == 0:
+        return 0, 0
+    # the step only depends on the position if every user interaction is an output message (which holds for the
+    # interactions of a system, as they are genuine messages) or lies beyond the end of the output
+    interaction_positions = numpy.searchsorted(output_messages, interactions)
+    if numpy.any((interaction_positions < n) & (output_messages[numpy.minimum(interaction_positions, n - 1)] != interactions)):
+        return compute_sample_totals_python(output_messages.tolist(), interactions.tolist(), system_id, to_ts, sample_duration, config)
+    # the next user interaction after each interaction; if there is none, it is set virtually beyond the end of the capture
+    next_interactions = numpy.append(interactions, output_messages[-1] + threshold)
+
+    def steps(positions: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # the next position and the contributions to the totals for each of the given positions
+        messages = output_messages[positions]
+        # index of the next message after the sample
+        next_after_sample = numpy.searchsorted(output_messages, messages + sample_duration)
+        stop = (messages >= to_ts - sample_duration) | (next_after_sample == n)
+        next_after_sample = numpy.minimum(next_after_sample, n - 1)
+        outage = output_messages[next_after_sample] - messages > threshold
+        next_interaction = next_interactions[numpy.searchsorted(interactions, messages, side="right")]
+        to_next_interaction = next_interaction - messages
+        # the interaction is within the current sample or somewhere within non-outage range: step to it
+        within_sample = ~outage & (to_next_interaction < sample_duration)
+        to_interaction = within_sample | (~outage & (to_next_interaction < threshold))
+        step = numpy.where(to_interaction, numpy.searchsorted(output_messages, next_interaction), next_after_sample)
+        task = numpy.where(within_sample, to_next_interaction, numpy.where(to_interaction, sample_duration, 0))
+        notask = numpy.where(to_interaction & ~within_sample, to_next_interaction - sample_duration, 0)
+        # an outage between here and the next interaction: step towards it (there is no outage within the sample)
+        notask = numpy.where(~outage & ~to_interaction, output_messages[next_after_sample] - messages, notask)
+        # stopping positions lead to the end and contribute nothing
+        return numpy.where(stop, n, step), numpy.where(stop, 0, task), numpy.where(stop, 0, notask)
+
+    # positions whose next interaction is at least threshold away: those before interaction k which are at least
+    # threshold before it, and all positions after the last interaction
+    range_starts = numpy.searchsorted(output_messages, numpy.append(output_messages[0], interactions))
+    range_ends = numpy.searchsorted(output_messages, next_interactions - threshold, side="right")
+    range_lengths = numpy.maximum(range_ends - range_starts, 0)
+    far = numpy.repeat(range_starts - numpy.cumsum(range_lengths) + range_lengths, range_lengths) + numpy.arange(int(numpy.sum(range_lengths)))
+    del range_starts, range_ends, range_lengths
+    # an outage is detected at most sample_duration before its end, so the following position ends an IA time longer
+    # than threshold - sample_duration
+    outage_ends = numpy.flatnonzero(numpy.diff(output_messages) > threshold - sample_duration) + 1
+    # from far positions, the path either advances one sample or steps to an interaction
+    visited = numpy.zeros(n + 1, dtype=bool)
+    visited[0] = True
+    visited[interaction_positions] = True
+    visited[outage_ends] = True
+    visited[far] = True
+    visited[numpy.searchsorted(output_messages, output_messages[far] + sample_duration)] = True
+    positions = numpy.flatnonzero(visited[:n])
+    del visited, far, outage_ends, interaction_positions
+    step, task, notask = steps(positions)
+    # translate the steps into indices of positions; the end is len(positions)
+    step_index = numpy.searchsorted(positions, step)
+    if numpy.any((step < n) & (positions[numpy.minimum(step_index, len(positions) - 1)] != step)):
+        raise RuntimeError("Sample counting reached an unexpected position")
+    del step
+    # follow the steps from position 0 and add up their contributions
+    steps_list: List[int] = step_index.tolist()
+    path: List[int] = []
+    i: int = 0
+    while i < len(positions):
+        path.append(i)
+        i = steps_list[i]
+        if progress is not None and len(path) % 1000000 == 0:
+            progress(int(positions[min(i, len(positions) - 1)]), n)
+    path_array = numpy.array(path, dtype=numpy.int64)
+    return int(numpy.sum(task[path_array])), int(numpy.sum(notask[path_array]))
+
+
+def compute_sample_totals_python(output_messages: List[int], user_interactions: List[int], system_id: Union[str, int], to_ts: int, sample_duration: int, config: Config) -> Tuple[int, int]:
+    """
+    Reference implementation of compute_sample_totals, stepping through the output one sample at a time.
+    """
+    i = 0
+    samples_task_total = samples_notask_total = 0
+    next_interaction_index = 0
+    while i < len(output_messages) and output_messages[i] < to_ts - sample_duration:
+        # index of the next message after the current sample
+        next_after_sample_index = bisect.bisect_left(output_messages, output_messages[i] + sample_duration)
+        # if we reached the end, quit
+        if next_after_sample_index == len(output_messages):
+            break
+        # check if there's an outage
+        if output_messages[next_after_sample_index] - output_messages[i] > config.interarrival_thresholds[system_id]:
+            i = next_after_sample_index
+            next_interaction_index = bisect.bisect_left(user_interactions, output_messages[next_after_sample_index])
+            continue
+        # if there is no more user interaction, set it virtually beyond the end of the capture
+        if next_interaction_index >= len(user_interactions):
+            next_interaction = output_messages[-1] + config.interarrival_thresholds[system_id]
+        else:
+            next_interaction = user_interactions[next_interaction_index]
+        to_next_interaction = next_interaction - output_messages[i]
+        # if the next interaction is within the current sample, step to it
+        if to_next_interaction < sample_duration:
+            samples_task_total += to_next_interaction
+            i = bisect.bisect_left(output_messages, next_interaction)
+            next_interaction_index += 1
+            continue
+        # if the next interaction is somewhere within non-outage range, step to it
+        if to_next_interaction < config.interarrival_thresholds[system_id]:
+            samples_task_total += sample_duration
+            samples_notask_total += to_next_interaction - sample_duration
+            i = bisect.bisect_left(output_messages, next_interaction)
+            next_interaction_index += 1
+            continue
+        # if there's an outage between here and the next interaction, step towards it
+        # however, we know that there's no outage within sample_duration seconds
+        samples_notask_total += output_messages[next_after_sample_index] - output_messages[i]
+        i = next_after_sample_index
+    return samples_task_total, samples_notask_total
+
+
+class SequentialStopping:
+    """
+    Track how the running maximum of epsilon and delta converges while batches of samples are evaluated in order.
+    Evaluation can stop once stopping_patience consecutive batches did not increase epsilon or delta by more than
+    stopping_tolerance, or once the samples evaluated since the last such increase make it unlikely that a further sample
+    would increase them: if none of the last m samples did, the probability of an increase is below
+    1 - (1 - stopping_confidence)^(1/m) with confidence stopping_confidence.
+    """
+    def __init__(self, samples_task_total: int, samples_notask_total: int, config: Config):
+        self.config = config
+        self.samples_task_total = samples_task_total
+        self.samples_notask_total = samples_notask_total
+        self.epsilon: float = 0.0
+        self.delta: float = 0.0
+        self.samples: int = 0
+        self.unchanged_samples: int = 0
+        self.unchanged_batches: int = 0
+
+    def add_batch(self, matches: List[Tuple[int, int]]) -> Optional[str]:
+        """
+        Fold the matches of the next batch into epsilon and delta.
+        Returns the reason to stop or None if evaluation should continue.
+        """
+        changed: bool = False
+        for matches_task, matches_notask in matches:
+            epsilon, delta = self.epsilon, self.delta
+            # Pr(O|T)
+            prob_1 = matches_task / self.samples_task_total
+            # Pr(O|not(T))
+            prob_2 = matches_notask / self.samples_notask_total
+            # if either probability is 0, we have a delta
+            if prob_1 == 0.0 or prob_2 == 0.0:
+                self.delta = max(self.delta, prob_1, prob_2)
             else:
-                matches_notask += 1
-    #print("\nReturning matches_task = {} and matches_notask = {} for sample {}".format(matches_task, matches_notask, sample))
-    return matches_task, matches_notask
+                self.epsilon = max(self.epsilon, math.log(max(prob_1, prob_2) / min(prob_1, prob_2)))
+            self.samples += 1
+            if self.epsilon - epsilon > self.config.stopping_tolerance or self.delta - delta > self.config.stopping_tolerance:
+                changed = True
+                self.unchanged_samples = 0
+            else:
+                self.unchanged_samples += 1
+        self.unchanged_batches = 0 if changed else self.unchanged_batches + 1
+        if not self.config.adaptive_stopping:
+            return None
+        if self.unchanged_batches >= self.config.stopping_patience:
+            return "converged"
+        if self.unchanged_samples > 0 and 1 - (1 - self.config.stopping_confidence) ** (1 / self.unchanged_samples) <= self.config.stopping_increase_probability:
+            return "confident"
+        return None
 
 
-# split systems, from crdt/stats.py
-if len(sys.argv) < 2:
-    print("Usage: ned.py <database>")
-    sys.exit(255)
-dbh: DatabaseHandler = DatabaseHandler(sys.argv[-1])
-systems: List[System] = list(dbh.systems())
-
-sys2 = systems[1]
-sys21 = System(sys2._dbh, "2.1", "System 2.1")
-setattr(sys21, "messages", functools.partial(sys2.messages, to_timestamp=1352588400))
-setattr(sys21, "timespan", functools.partial(sys2.timespan, override_to=1352588400))
-sys22 = System(sys2._dbh, "2.2", "System 2.2")
-setattr(sys22, "messages", functools.partial(sys2.messages, from_timestamp=1352588400))
-setattr(sys22, "timespan", functools.partial(sys2.timespan, override_from=1352588400))
-systems[1:2] = [sys21, sys22]
-
-# print LaTeX table header
-output_file_suffix: str = ""
-if len(sys.argv) > 2:
-    output_file_suffix = "-" + sys.argv[1]
-results_latex = open(socket.gethostname() + output_file_suffix + "-ned-results-" + str(settings.SAMPLE_COUNT) + "-" + str(settings.SAMPLE_DURATION) + ".tex", "w")
-print("System")
-for l, _ in settings.lambdas:
-    print(" & \\multicolumn{{2}}{{c}}{{$\\lambda={:.6f}$}}".format(l), end="", file=results_latex)
-print(" \\\\", file=results_latex)
-for l, _ in settings.lambdas:
-    print("& TI & $\\varepsilon,\\delta$", end="", file=results_latex)
-print(" \\\\", file=results_latex)
-
-for system in systems:
-    print("System {}:".format(system.id))
-    print("{}".format(system.id), end="", file=results_latex)
-    # get system timespan
-    from_ts, to_ts = system.timespan()
-    from_ts = round(from_ts / settings.TIMESTAMP_PRECISION[system.id])
-    to_ts = round(to_ts / settings.TIMESTAMP_PRECISION[system.id])
-    # make a list of genuine messages, possibly multiplying by 10^x to get integers
-    genuine: List[int] = []
-    # make two lists for present and absent inter-arrival times
-    last_message: Optional[Message] = None
-    for message in system.messages():
-        timestamp = round(message.timestamp / settings.TIMESTAMP_PRECISION[system.id])
-        genuine.append(timestamp)
-        last_message = message
-        print("    Reading genuine messages {: 3,d}%".format(round((message.timestamp - from_ts)/(to_ts - from_ts)*100)), end="\r")
-    print()
-    print("    {:,d} messages read".format(len(genuine)))
-    # try out all specified values for lambda
-    for lambd, description in settings.lambdas:
-        print("    Lambda {:.6f} ({})".format(lambd, description))
-        output_messages: List[int] = [genuine[0]]
-        # parallellise
-        with multiprocessing.Pool(initializer=random.seed) as pool:
-            chunk_size: int = 5000
-            results = []
-            for i in range(0, len(genuine)-1, chunk_size):
-                chunk = genuine[i:min(i+chunk_size+1, len(genuine))]
-                results.append(pool.apply_async(compute_ned_dummies, [chunk, system.id, lambd]))
-                print("        Delegating {} chunks".format(len(results)), end="\r")
-            print()
-            for i in range(len(results)):
-                print("        Waiting for results {: 2d}/{: 2d}".format(i+1, len(results)), end="\r")
-                output_messages += results[i].get()
-        print()
-        print("        System output: {:,d} messages ({:,d} dummies)".format(len(output_messages), len(output_messages) - len(genuine)))
-        print("        Traffic increase (factor): {: 1,.2f}".format(len(output_messages) / len(genuine) - 1))
-        print(" & \\num{{{:1.2f}}}".format(len(output_messages) / len(genuine) - 1), end="", file=results_latex)
-
-        # convert output_messages into a shared_ctypes array
-        print("        Converting system output...", end="")
-        sys.stdout.flush()
-        # note: we use a RawArray without a lock because subprocesses will only read, not write
-        output_messages_shared = multiprocessing.sharedctypes.RawArray(ctypes.c_uint64, output_messages)
-        print(" ✓", end="")
-        sys.stdout.flush()
-        output_ia_times: List[int] = [output_messages_shared[i+1] - output_messages_shared[i] for i in range(len(output_messages_shared) - 1)]
-        print(" ✓", end="")
+def collect_samples(store_directory: str, genuine_parameters: Dict[str, Any], output_parameters: Dict[str, Any], system_id: Union[str, int], from_ts: int, to_ts: int, sample_duration: int, config: Config) -> Tuple[numpy.ndarray, numpy.ndarray, Dict[str, int], str]:
+    """
+    Draw the samples to evaluate (see draw_samples).
+    Returns the samples (their concatenated IA times and their lengths), the number of task and no-task samples and the
+    reason drawing stopped.
+    """
+    store = ArtifactCache(store_directory)
+    output_messages: numpy.ndarray = store.load("output", output_parameters)
+    output_ia_times: numpy.ndarray = store.load("ia", output_parameters)
+    user_interactions: numpy.ndarray = store.load("interactions", interactions_parameters(genuine_parameters, config))
+    samples_drawn: Dict[str, int] = {"task": 0, "notask": 0}
+    seed: Optional[int] = random_seed(config, "draw", system_id, output_parameters["lambd"], sample_duration)
+    samples: List[numpy.ndarray] = []
+    draw = draw_samples(output_messages, output_ia_times, user_interactions, system_id, from_ts, to_ts, sample_duration, samples_drawn, config, seed)
+    while True:
+        try:
+            samples.append(numpy.asarray(next(draw), dtype=numpy.int64))
+        except StopIteration as stop:
+            values = numpy.concatenate(samples) if samples else numpy.zeros(0, dtype=numpy.int64)
+            return values, numpy.array([len(sample) for sample in samples], dtype=numpy.int64), samples_drawn, stop.value
+
+
+def suffix_array_parameters(output_parameters: Dict[str, Any], config: Config) -> Dict[str, Any]:
+    """
+    Return the parameters under which the suffix array of a system output is stored (see InterArrivalIndex).
+    """
+    return dict(output_parameters, depth=config.ia_index_depth)
+
+
+def build_suffix_array(store_directory: str, output_parameters: Dict[str, Any], config: Config):
+    """
+    Build the suffix array of a system output (unless it is stored already), which the InterArrivalIndex of every sample
+    duration shares.
+    """
+    store = ArtifactCache(store_directory)
+    parameters: Dict[str, Any] = suffix_array_parameters(output_parameters, config)
+    if InterArrivalIndex.load_suffix_array(store, parameters) is None:
+        output_ia_times: numpy.ndarray = store.load("ia", output_parameters)
+        instrumentation.count("output_messages", len(output_ia_times) + 1)
+        InterArrivalIndex.save_suffix_array(store, parameters, InterArrivalIndex.build_suffix_array(output_ia_times, config.ia_index_depth))
+
+
+def index_parameters_for(output_parameters: Dict[str, Any], sample_duration: int, config: Config) -> Dict[str, Any]:
+    """
+    Return the parameters under which the InterArrivalIndex of a system output and sample duration is stored.
+    """
+    # the index contains the interactions
+    return dict(interactions_parameters(output_parameters, config), sample_duration=sample_duration, depth=config.ia_index_depth)
+
+
+def build_index(store_directory: str, genuine_parameters: Dict[str, Any], output_parameters: Dict[str, Any], system_id: Union[str, int], sample_duration: int, config: Config) -> Dict[str, Any]:
+    """
+    Build the InterArrivalIndex of a system output for a sample duration (unless it is stored already) and return a
+    handle to attach to it. The suffix array is built unless it is stored already (see build_suffix_array).
+    """
+    store = ArtifactCache(store_directory)
+    index_parameters: Dict[str, Any] = index_parameters_for(output_parameters, sample_duration, config)
+    suffix_parameters: Dict[str, Any] = suffix_array_parameters(output_parameters, config)
+    output_messages: numpy.ndarray = store.load("output", output_parameters)
+    output_ia_times: numpy.ndarray = store.load("ia", output_parameters)
+    instrumentation.count("output_messages", len(output_messages))
+    index: Optional[InterArrivalIndex] = InterArrivalIndex.load(store, suffix_parameters, index_parameters, output_messages, output_ia_times)
+    if index is None:
+        suffix_array = InterArrivalIndex.load_suffix_array(store, suffix_parameters)
+        index = InterArrivalIndex(output_messages, output_ia_times, store.load("interactions", interactions_parameters(genuine_parameters, config)), system_id, sample_duration, config, suffix_array)
+        index.save(store, suffix_parameters, index_parameters)
+    return index.handle()
+
+
+def estimate_exact_stage(store_directory: str, genuine_parameters: Dict[str, Any], output_parameters: Dict[str, Any], system_id: Union[str, int], from_ts: int, to_ts: int, sample_duration: int, config: Config) -> Tuple[float, float, int, int]:
+    store = ArtifactCache(store_directory)
+    return estimate_exact(
+        store.load("output", output_parameters),
+        store.load("ia", output_parameters),
+        store.load("interactions", interactions_parameters(genuine_parameters, config)),
+        system_id,
+        from_ts,
+        to_ts,
+        sample_duration,
+        config
+    )
+
+
+class Evaluation:
+    """
+    The results of evaluate(): the traffic increase per system id and lambda, the estimates per system id, lambda and
+    sample duration
+    """
+    def __init__(self, system_ids: List[Union[str, int]]):
+        self.system_ids = system_ids
+        # the factor by which dummy traffic increases the number of messages
+        self.traffic_increase: Dict[Tuple[Union[str, int], float], float] = {}
+        self.estimates: Dict[Tuple[Union[str, int], float, float], Tuple[float, float]] = {}
+        # why the estimation stopped and how many samples it evaluated
+        self.stopping: Dict[Tuple[Union[str, int], float, float], Tuple[str, int]] = {}
+
+    @classmethod
+    def from_results(cls, results: List[Dict[str, Any]], system_ids: Optional[List[Union[str, int]]] = None) -> "Evaluation":
+        """
+        Create an evaluation from the results written by a ResultsSink (see results.read_results).
+        Parameters:
+            results The results
+            system_ids The order of the systems; by default, they are sorted by their id
+        """
+        evaluation = cls(system_ids if system_ids is not None else sorted({result["system"] for result in results}, key=str))
+        for result in results:
+            key = (result["system"], result["lambda"], result["sample_duration"])
+            evaluation.traffic_increase[key[0:2]] = result["traffic_increase"]
+            evaluation.estimates[key] = (result["epsilon"], result["delta"])
+            evaluation.stopping[key] = (result["stopping"], result["samples"])
+        return evaluation
+
+
+def evaluate(database: str, config: Config, resume: bool = False, pool=None, results: Optional[ResultsSink] = None) -> Evaluation:
+    """
+    Estimate epsilon and delta for all systems of a database and all lambdas of the config.
+    The stages (reading the database, generating dummy traffic, counting and drawing samples, matching them against the
+    system output and computing epsilon and delta) run as one job graph on a pool of worker processes.
+    Parameters:
+        database The database file
+        config The parameters of the evaluation
+        resume Continue an interrupted evaluation with the same database and config from its checkpoints
+        pool A multiprocessing pool to run the stages on; if None, a pool is created for the evaluation
+        results A sink to write the result of every system, lambda and sample duration to as soon as it is computed
+    """
+    dbh: DatabaseHandler = DatabaseHandler(database)
+    # create the timestamp index before the workers read the database concurrently
+    dbh.ensure_timestamp_index()
+    systems: List[System] = get_systems(dbh)
+    # intermediate arrays are exchanged between the stages through the cache or, if it is disabled, a temporary directory
+    temporary_directory: Optional[tempfile.TemporaryDirectory] = None
+    database_fingerprint: str = ""
+    if config.cache_directory is not None:
+        store = ArtifactCache(config.cache_directory, config.cache_max_bytes)
+        print("Fingerprinting database...", end="")
         sys.stdout.flush()
-        output_ia_times_shared = multiprocessing.sharedctypes.RawArray(ctypes.c_uint64, output_ia_times)
-        print(" ✓", end="")
+        database_fingerprint = store.database_fingerprint(database)
+        print(" ✓")
+    elif config.checkpoint_directory is not None:
+        # keep the generated output until the run is finished, so it can be resumed
+        store = ArtifactCache(os.path.join(config.checkpoint_directory, "artifacts"))
+        print("Fingerprinting database...", end="")
         sys.stdout.flush()
-        print()
-
-        # get all messages from interactive devices
-        print("        Estimating epsilon and delta")
-        c = dbh.cursor()
-        # fix split systems
-        if isinstance(system.id, str):
-            real_system_id: int = int(system.id[0:1])
-            from_to: str = "AND messages.timestamp >= {} AND messages.timestamp <= {}".format(*system.timespan(fix=False))
-        else:
-            real_system_id = system.id
-            from_to = ""
-
-        c.execute("""
-            SELECT DISTINCT messages.timestamp
-            FROM 
-                messages 
-                INNER JOIN sources ON messages.message_id = sources.message_id
-                INNER JOIN devices ON sources.device_id = devices.device_id
-                INNER JOIN presence ON messages.message_id = presence.message_id
-            WHERE
-                messages.system_id = ? AND
-                (
-                    devices.description GLOB "*3S*" OR
-                    devices.description GLOB "F *.*" OR
-                    devices.description GLOB "* KF *.*" OR
-                    messages.system_id = 3
-                )
-                {}
-            ;
-        """.format(from_to), (real_system_id,))
-        user_interactions: List[int] = [round(r[0] / settings.TIMESTAMP_PRECISION[system.id]) for r in c.fetchall()]
-        print("            {} user interactions found".format(len(user_interactions)))
-        # calculate how many samples there are containing interactions and how many there are containing none
-        print("            Counting samples with/without user interaction...", end="\r")
-        i = 0
-        samples_task_total = samples_notask_total = 0
-        next_interaction_index = 0
-        sample_duration = round(settings.SAMPLE_DURATION / settings.TIMESTAMP_PRECISION[system.id])
-        while i < len(output_messages) and output_messages[i] < to_ts - sample_duration:
-            print("            Counting samples with/without user interaction... {: 3.0f}%".format(i / len(output_messages) * 100), end="\r")
-            # index of the next message after the current sample
-            next_after_sample_index = bisect.bisect_left(output_messages, output_messages[i] + sample_duration)
-            # if we reached the end, quit
-            if next_after_sample_index == len(output_messages):
-                break
-            # check if there's an outage
-            if output_messages[next_after_sample_index] - output_messages[i] > settings.INTERARRIVAL_THRESHOLDS[system.id]:
-                i = next_after_sample_index
-                next_interaction_index = bisect.bisect_left(user_interactions, output_messages[next_after_sample_index])
-                continue
-            # if there is no more user interaction, set it virtually beyond the end of the capture
-            if next_interaction_index >= len(user_interactions):
-                next_interaction = output_messages[-1] + settings.INTERARRIVAL_THRESHOLDS[system.id]
-            else:
-                next_interaction = user_interactions[next_interaction_index]
-            to_next_interaction = next_interaction - output_messages[i]
-            # if the next interaction is within the current sample, step to it
-            if to_next_interaction < sample_duration:
-                samples_task_total += to_next_interaction
-                i = bisect.bisect_left(output_messages, next_interaction)
-                next_interaction_index += 1
-                continue
-            # if the next interaction is somewhere within non-outage range, step to it
-            if to_next_interaction < settings.INTERARRIVAL_THRESHOLDS[system.id]:
-                samples_task_total += sample_duration
-                samples_notask_total += to_next_interaction - sample_duration
-                i = bisect.bisect_left(output_messages, next_interaction)
-                next_interaction_index += 1
-                continue
-            # if there's an outage between here and the next interaction, step towards it
-            # however, we know that there's no outage within sample_duration seconds
-            samples_notask_total += output_messages[next_after_sample_index] - output_messages[i]
-            i = next_after_sample_index
-        print()
-        print("            {} samples with tasks, {} without".format(samples_task_total, samples_notask_total))
-        # compute epsilon and delta for various samples in parallel
-        epsilon: float = 0.0
-        delta: float = 0.0
-        # keep track of which samples we already checked; make sure we don't check a sample twice (e.g. an empty one)
-        samples_checked: Set[Tuple[int]] = set()
-        with multiprocessing.Pool(initializer=random.seed) as pool:
-            results = []
-            computation_start: datetime.datetime = datetime.datetime.now()
-            # make sure to get an even number of task and no-task samples if possible
-            samples_task: int = 0
-            samples_notask: int = 0
-            print("            Delegating samples.", end="\r")
-            # collect SAMPLE_COUNT samples, but use a timeout in case we don't get the number we want
-            while len(results) < settings.SAMPLE_COUNT and (datetime.datetime.now() - computation_start).total_seconds() < settings.SAMPLE_TIMEOUT:
-                # generate a sample start time
-                sample_start_time: int = random.randint(from_ts + 1, to_ts - sample_duration)
-                # collect garbage from time to time
-                if sample_start_time % 100 == 0:
-                    gc.collect()
-                # check if it's close to or inside an outage
-                insert_pos: List[int] = [
-                    bisect.bisect_left(output_messages, sample_start_time),
-                    bisect.bisect_left(output_messages, sample_start_time + sample_duration)
-                ]
-                in_outage: bool = False
-                for insert_p in insert_pos:
-                    if 0 < insert_p < len(output_messages) and output_ia_times[insert_p - 1] > settings.INTERARRIVAL_THRESHOLDS[system.id]:
-                        in_outage = True
-                        break
-                if in_outage:
-                    del sample_start_time, insert_pos, in_outage
-                    continue
-                del in_outage
-                # assemble the sample
-                sample: List[int] = []
-                for i in range(insert_pos[0], len(output_messages)):
-                    if i == insert_pos[0]:
-                        difference: int = output_messages[i] - sample_start_time
-                    else:
-                        difference = output_messages[i] - output_messages[i-1]
-                    if difference > sample_duration:
-                        break
-                    sample.append(difference)
-                del insert_pos
-                # check if sample contains an interaction
-                task = False
-                insert_p = bisect.bisect_left(user_interactions, sample_start_time)
-                if insert_p < len(user_interactions) and user_interactions[insert_p] - sample_start_time <= sample_duration:
-                    task = True
-                # if we already have too many task samples, try again
-                if task and samples_task > 1.5 * samples_notask + 900:
-                    del sample, sample_start_time, task, insert_p
-                    continue
-                # if we already have too many non-task samples, try again
-                elif not task and samples_notask > 1.5 * samples_task + 900:
-                    del sample, sample_start_time, task, insert_p
-                    continue
-                # check if we already had this sample
-                sample_tuple = tuple(sample)
-                if sample_tuple in samples_checked:
-                    del sample, sample_start_time, sample_tuple, task, insert_p
+        database_fingerprint = store.database_fingerprint(database)
+        print(" ✓")
+    else:
+        # prefer a memory-backed file system, if available
+        temporary_directory = tempfile.TemporaryDirectory(prefix="ned-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        store = ArtifactCache(temporary_directory.name)
+    checkpoints = RunCheckpoints(config.checkpoint_directory, dict(config.run_parameters(), database=database_fingerprint), resume)
+
+    evaluation = Evaluation([system.id for system in systems])
+    traffic_increase = evaluation.traffic_increase
+    estimates = evaluation.estimates
+    stopping = evaluation.stopping
+    max_running: int = config.max_running_jobs if config.max_running_jobs is not None else 2 * (os.cpu_count() or 1)
+    sweep_lambdas: List[float] = sweep_lambdas_for(config)
+    descriptions: Dict[float, str] = dict(config.lambdas)
+    # the cache files which pending jobs still use, per system, system and lambda, or system, lambda and sample duration;
+    # they are not evicted until their owner is released
+    in_use: Dict[Tuple[Any, ...], Set[str]] = {}
+    # the sample durations per system and lambda, and the number of lambdas per system, which are not estimated yet
+    durations_left: Dict[Tuple[Union[str, int], float], Set[float]] = {}
+    lambdas_left: Dict[Union[str, int], int] = {}
+    # the number of queued or running match jobs per system, lambda and sample duration, which attach to its index and
+    # output; with adaptive stopping, the estimate can be finished before all of them are
+    attached: Dict[Tuple[Union[str, int], float, float], int] = {}
+
+    def use(owner: Tuple[Any, ...], kind: str, parameters: Dict[str, Any]):
+        in_use.setdefault(owner, set()).add(store.path(kind, parameters))
+
+    def evict():
+        # keep the cache within its size limit during the run
+        store.evict(keep=set().union(*in_use.values()))
+
+    def release(key: Tuple[Union[str, int], float, float]):
+        # the artifacts of a sample duration are not needed anymore, nor those of its system and lambda (or its system)
+        # once all of their sample durations are estimated; they are released when the last match job attached to them
+        # is finished
+        if attached.get(key, 0) > 0:
+            return
+        in_use.pop(key, None)
+        durations_left[key[0:2]].discard(key[2])
+        if not durations_left[key[0:2]]:
+            del durations_left[key[0:2]]
+            in_use.pop(key[0:2], None)
+            lambdas_left[key[0]] -= 1
+            if lambdas_left[key[0]] == 0:
+                in_use.pop(key[0:1], None)
+            evict()
+
+    def report(key: Tuple[Union[str, int], float, float], checkpoint: Checkpoint, **details: Any):
+        # record the result of a system, lambda and sample duration in its checkpoint (unless it was recorded by an
+        # earlier run) and write it to the results sink
+        if "result" not in checkpoint:
+            now: datetime.datetime = datetime.datetime.now()
+            checkpoint.update(result=dict({
+                "system": key[0],
+                "lambda": key[1],
+                "description": descriptions[key[1]],
+                "sample_duration": key[2],
+                "traffic_increase": traffic_increase[key[0:2]],
+                "epsilon": estimates[key][0],
+                "delta": estimates[key][1],
+                "stopping": stopping[key][0],
+                "samples": stopping[key][1],
+                "seed": config.seed,
+                # when the result was computed, in seconds since the run started; the stages of a result share their
+                # jobs with other lambdas and sample durations and run interleaved with them, so they are not timed
+                "elapsed_since_start": (now - computation_start).total_seconds(),
+                "finished": now.isoformat(timespec="seconds"),
+            }, **details))
+        if results is not None:
+            results.write(checkpoint["result"])
+        release(key)
+
+    classify_jobs: Dict[Union[str, int], List[Tuple[Any, ...]]] = {}
+
+    def add_classify_job(scheduler: Scheduler, system: System, genuine_parameters: Dict[str, Any]) -> List[Tuple[Any, ...]]:
+        # the interactions are classified once per database system and shared by its split systems
+        if system.system_id in classify_jobs:
+            return classify_jobs[system.system_id]
+        parameters: Dict[str, Any] = classification_parameters(genuine_parameters, system.system_id, config)
+        classify_jobs[system.system_id] = []
+        if store.load("interaction_timestamps", parameters) is None:
+
+            def classified(matches: Dict[str, Tuple[int, int]]):
+                for pattern, (devices, messages) in matches.items():
+                    print("System {}: {} matched {:,d} devices and {:,d} messages".format(system.system_id, pattern if pattern == "all devices" else "pattern \"{}\"".format(pattern), devices, messages))
+
+            classify_jobs[system.system_id].append(("classify", system.system_id))
+            scheduler.add(Job(classify_jobs[system.system_id][0], classify_stage, [database, store.directory, system.system_id, parameters, config], done=classified))
+        return classify_jobs[system.system_id]
+
+    def add_system_jobs(scheduler: Scheduler, system: System):
+        genuine_parameters: Dict[str, Any] = genuine_parameters_for(database_fingerprint, system.id, config)
+        lambdas_left[system.id] = len(config.lambdas)
+        use((system.id,), "genuine", genuine_parameters)
+        use((system.id,), "interactions", interactions_parameters(genuine_parameters, config))
+        use((system.id,), "interaction_timestamps", classification_parameters(genuine_parameters, system.system_id, config))
+
+        def ingested(partitions: int):
+            if partitions > 0:
+                combine_partitions(store, genuine_parameters, partitions)
+            genuine: numpy.ndarray = store.load("genuine", genuine_parameters)
+            from_ts, to_ts = int(genuine[0]), int(genuine[-1])
+            print("System {}: {:,d} messages read".format(system.id, len(genuine)))
+            sweep_jobs: Dict[float, List[Tuple[Any, ...]]] = {}
+            if sweep_lambdas:
+                sweep_jobs = add_sweep_jobs(scheduler, system, genuine, genuine_parameters)
+            # try out all specified values for lambda
+            for lambd, description in config.lambdas:
+                add_lambda_jobs(scheduler, system, genuine, genuine_parameters, lambd, description, from_ts, to_ts, sweep_jobs.get(lambd, []))
+
+        # the user interactions are read while the messages are read in parallel partitions
+        interaction_jobs: List[Tuple[Any, ...]] = []
+        if store.load("interactions", interactions_parameters(genuine_parameters, config)) is None:
+            interaction_jobs.append(("interactions", system.id))
+            scheduler.add(Job(interaction_jobs[0], read_interactions, [database, store.directory, system.id, genuine_parameters, config], dependencies=add_classify_job(scheduler, system, genuine_parameters)))
+        if store.load("genuine", genuine_parameters) is not None:
+            scheduler.add(Job(("ingest", system.id), ingested, [0], dependencies=interaction_jobs, local=True))
+            return
+
+        def planned(bounds: List[float]):
+            edges: List[Optional[float]] = [None] + list(bounds) + [None]
+            read_jobs: List[Tuple[Any, ...]] = []
+            for k in range(len(edges) - 1):
+                use((system.id,), "partition", dict(genuine_parameters, partition=k))
+                read_jobs.append(("read", system.id, None, k))
+                scheduler.add(Job(read_jobs[-1], read_partition, [database, store.directory, system.id, genuine_parameters, k, edges[k], edges[k+1], config], memory=40 * config.ingest_partition_rows))
+            scheduler.add(Job(("ingest", system.id), ingested, [len(read_jobs)], dependencies=read_jobs + interaction_jobs, local=True))
+
+        scheduler.add(Job(("partition", system.id), plan_partitions, [database, system.id, config], done=planned))
+
+    def chunk_parameters_for(output_parameters: Dict[str, Any], i: int) -> Dict[str, Any]:
+        return dict(output_parameters, chunk=i)
+
+    def add_generate_jobs(scheduler: Scheduler, system: System, genuine: numpy.ndarray, output_parameters: Dict[float, Dict[str, Any]], sweep: bool) -> List[Tuple[Any, ...]]:
+        # generate dummy traffic in parallel chunks, for one lambda or all lambdas of a sweep
+        stream: Any = sweep_lambdas if sweep else next(iter(output_parameters))
+        chunk_jobs: List[Tuple[Any, ...]] = []
+        chunk_size: int = 5000
+        for i in range(0, len(genuine)-1, chunk_size):
+            chunk = genuine[i:min(i+chunk_size+1, len(genuine))]
+            expected_output = sum(len(chunk) + max(lambd, 0) * config.timestamp_precision[system.id] * int(chunk[-1] - chunk[0]) for lambd in output_parameters)
+            chunk_jobs.append(("generate", system.id, None if sweep else stream, i))
+            chunk_parameters = [(lambd, chunk_parameters_for(parameters, i)) for lambd, parameters in output_parameters.items()]
+            for lambd, parameters in chunk_parameters:
+                use((system.id, lambd), "chunk", parameters)
+            # the lambdas of a sweep share their substream
+            seed: Optional[int] = random_seed(config, "generate", system.id, stream, i)
+            scheduler.add(Job(chunk_jobs[-1], generate_output_chunk, [store.directory, chunk_parameters, chunk, system.id, config, seed, sweep_lambdas if sweep else None], memory=int(32 * expected_output)))
+        return chunk_jobs
+
+    def finished(system_id: Union[str, int], lambd: float) -> bool:
+        # whether all sample durations of a system and lambda are estimated already
+        return all("estimate" in checkpoints.pair(system_id, lambd, duration) for duration in config.durations())
+
+    def add_sweep_jobs(scheduler: Scheduler, system: System, genuine: numpy.ndarray, genuine_parameters: Dict[str, Any]) -> Dict[float, List[Tuple[Any, ...]]]:
+        # generate the outputs of all lambdas which are neither finished nor stored already in one pass, from the random
+        # numbers of the whole sweep
+        lambdas: List[float] = [lambd for lambd in sweep_lambdas if not finished(system.id, lambd) and store.load("output", output_parameters_for(genuine_parameters, system.id, lambd, config)) is None]
+        if not lambdas:
+            return {}
+        chunk_jobs = add_generate_jobs(scheduler, system, genuine, {lambd: output_parameters_for(genuine_parameters, system.id, lambd, config) for lambd in lambdas}, True)
+        return {lambd: chunk_jobs for lambd in lambdas}
+
+    def add_lambda_jobs(scheduler: Scheduler, system: System, genuine: numpy.ndarray, genuine_parameters: Dict[str, Any], lambd: float, description: str, from_ts: int, to_ts: int, sweep_jobs: List[Tuple[Any, ...]]):
+        key = (system.id, lambd)
+        # the output and traffic increase are recorded per system and lambda, the estimates per sample duration
+        checkpoint: Checkpoint = checkpoints.pair(*key)
+        duration_checkpoints: Dict[float, Checkpoint] = {duration: checkpoints.pair(*key, duration) for duration in config.durations()}
+        durations_left[key] = set(duration_checkpoints)
+        if "traffic_increase" in checkpoint and finished(*key):
+            traffic_increase[key] = checkpoint["traffic_increase"]
+            for duration, duration_checkpoint in duration_checkpoints.items():
+                estimates[key + (duration,)] = tuple(duration_checkpoint["estimate"])
+                stopping[key + (duration,)] = tuple(duration_checkpoint["stopping"])
+                report(key + (duration,), duration_checkpoint)
+                print("System {}, lambda {:.6f} ({}), sample duration {}s: restored from checkpoint, traffic increase (factor): {:1,.2f}, epsilon {:.10f}, delta {:.10f} ({} after {} samples)".format(system.id, lambd, description, duration, traffic_increase[key], *estimates[key + (duration,)], *stopping[key + (duration,)]))
+            return
+        output_parameters: Dict[str, Any] = output_parameters_for(genuine_parameters, system.id, lambd, config)
+        stage_args = [store.directory, genuine_parameters, output_parameters, system.id]
+        use(key, "output", output_parameters)
+        use(key, "ia", output_parameters)
+        for name in InterArrivalIndex._SUFFIX_ARRAYS:
+            use(key, "index", dict(suffix_array_parameters(output_parameters, config), array=name))
+        # generate dummy traffic, unless the output is stored already or generated by a sweep
+        chunk_jobs: List[Tuple[Any, ...]] = list(sweep_jobs)
+        if store.load("output", output_parameters) is None and not sweep_jobs:
+            chunk_jobs = add_generate_jobs(scheduler, system, genuine, {lambd: output_parameters}, False)
+
+        def merge():
+            # combine the chunks into the system output, one chunk at a time
+            if store.load("output", output_parameters) is None:
+                chunk_outputs: List[numpy.ndarray] = [store.load("chunk", chunk_parameters_for(output_parameters, name[-1])) for name in chunk_jobs]
+                output_messages = store.store_chunks("output", output_parameters, itertools.chain([genuine[0:1]], chunk_outputs), 1 + sum(len(chunk_output) for chunk_output in chunk_outputs), evict=False)
+                del chunk_outputs
+                for name in chunk_jobs:
+                    store.remove("chunk", chunk_parameters_for(output_parameters, name[-1]))
+                    scheduler.results.pop(name, None)
+                # derive the IA times block by block
+                blocks = (numpy.diff(output_messages[i:i+MERGE_BLOCK_SIZE+1]) for i in range(0, len(output_messages) - 1, MERGE_BLOCK_SIZE))
+                store.store_chunks("ia", output_parameters, blocks, len(output_messages) - 1, evict=False)
+            output_messages = store.load("output", output_parameters)
+            output_length: int = len(output_messages)
+            traffic_increase[key] = output_length / len(genuine) - 1
+            print("System {}, lambda {:.6f} ({}): {:,d} messages ({:,d} dummies), traffic increase (factor): {:1,.2f}".format(system.id, lambd, description, output_length, output_length - len(genuine), traffic_increase[key]))
+            # progress from an earlier run only applies to the very same output
+            output_checksum: str = array_checksum(output_messages)
+            if checkpoint.data.get("output_checksum") != output_checksum:
+                checkpoint.reset(output_checksum=output_checksum, traffic_increase=traffic_increase[key])
+                for duration_checkpoint in duration_checkpoints.values():
+                    duration_checkpoint.reset()
+            # all sample durations are evaluated against the same output, IA times, interactions and suffix array
+            suffix_jobs: List[Tuple[Any, ...]] = []
+            for duration, duration_checkpoint in duration_checkpoints.items():
+                if "estimate" in duration_checkpoint:
+                    estimates[key + (duration,)] = tuple(duration_checkpoint["estimate"])
+                    stopping[key + (duration,)] = tuple(duration_checkpoint["stopping"])
+                    report(key + (duration,), duration_checkpoint)
                     continue
-                samples_checked.add(sample_tuple)
-                del sample_tuple
-                if task:
-                    samples_task += 1
-                else:
-                    samples_notask += 1
-                # now submit the sample to the subprocesses
-                results.append(
-                    pool.apply_async(
-                        compute_matches,
-                        [
-                            system.id,
-                            sample,
-                            user_interactions
-                        ]
-                    )
-                )
-                del sample, sample_start_time, task, insert_p
-                print("            Delegated {} samples; {} tasks and {} non-tasks".format(len(results), samples_task, samples_notask), end="\r")
-            print()
-            for i in range(1, len(results) + 1):
-                print("            Waiting for results {: 3d}/{: 3d}".format(i, len(results)), end="")
-                sys.stdout.flush()
-                matches_task, matches_notask = results[i-1].get()
-
-                # Pr(O|T)
-                prob_1 = matches_task / samples_task_total
-                # Pr(O|not(T))
-                prob_2 = matches_notask / samples_notask_total
-                # if either probability is 0, we have a delta
-                #print("\nGot matches_task = {}, matches_notask = {} for task_total {} and notask_total {}".format(matches_task, matches_notask, samples_task_total, samples_notask_total))
-                if prob_1 == 0.0 or prob_2 == 0.0:
-                    delta = max(delta, prob_1, prob_2)
-                else:
-                    epsilon = max(epsilon, math.log(max(prob_1, prob_2) / min(prob_1, prob_2)))
-                now: datetime.datetime = datetime.datetime.now()
-                eta: datetime.timedelta = (now - computation_start) * (len(results) - i) / i
-                eta_time: datetime.datetime = now + eta
-                print("    ETA: {: 6d}s ({})".format(int(eta.total_seconds()), eta_time.strftime("%H:%M:%S")), end="\r")
-            print("            Waiting for results {: 3d}/{: 3d}, total duration: {}".format(len(results), len(results), str(now - computation_start)))
-        print("            Epsilon: {: .10f}".format(epsilon))
-        print("            Delta:   {: .10f}".format(delta))
-        print(" & $\\varepsilon={:.10f}$ $\\delta={:.10f}$".format(epsilon, delta), end="", file=results_latex)
+                sample_duration: int = round(duration / config.timestamp_precision[system.id])
+                add_estimation_jobs(scheduler, key + (duration,), duration_checkpoint, stage_args, output_length, from_ts, to_ts, sample_duration, suffix_jobs)
+            evict()
+
+        scheduler.add(Job(("merge",) + key, merge, dependencies=chunk_jobs, local=True))
+
+    def add_estimation_jobs(scheduler: Scheduler, key: Tuple[Union[str, int], float, float], checkpoint: Checkpoint, stage_args: List[Any], output_length: int, from_ts: int, to_ts: int, sample_duration: int, suffix_jobs: List[Tuple[Any, ...]]):
+        # every finished stage is recorded in the checkpoint; stages recorded by an earlier run are skipped
+        if config.estimation_mode == "exact":
+            def exact_done(result: Tuple[float, float, int, int]):
+                estimates[key] = result[0:2]
+                stopping[key] = ("exact", result[2] + result[3])
+                checkpoint.update(estimate=estimates[key], stopping=stopping[key])
+                report(key, checkpoint, messages=output_length, samples_task=result[2], samples_notask=result[3])
+                print("System {}, lambda {:.6f}, sample duration {}s: {} samples with tasks, {} without, epsilon {:.10f}, delta {:.10f}".format(*key, result[2], result[3], *result[0:2]))
+            scheduler.add(Job(("exact",) + key, estimate_exact_stage, stage_args + [from_ts, to_ts, sample_duration, config], memory=200 * output_length, done=exact_done))
+            return
+        # counting, drawing samples and indexing are independent of each other
+        if "counts" not in checkpoint:
+            scheduler.add(Job(("count",) + key, count_samples, stage_args + [to_ts, sample_duration, config], memory=80 * output_length, done=lambda counts: checkpoint.update(counts=counts)))
+        if "samples_drawn" not in checkpoint:
+
+            def drawn(result: Tuple[numpy.ndarray, numpy.ndarray, Dict[str, int], str]):
+                # the samples are written once, the matches of every batch are appended to a log (see Checkpoint)
+                scheduler.results.pop(("draw",) + key, None)
+                checkpoint.store_samples(result[0], result[1])
+                checkpoint.update(samples_drawn=result[2], draw_stop=result[3])
+            scheduler.add(Job(("draw",) + key, collect_samples, stage_args + [from_ts, to_ts, sample_duration, config], memory=16 * output_length, done=drawn))
+
+        def add_match_jobs():
+            values, lengths = checkpoint.samples()
+            sample_starts = numpy.concatenate([[0], numpy.cumsum(lengths)])
+            batch_count: int = -(-len(lengths) // config.sample_batch_size)
+
+            def batch(i: int) -> List[List[int]]:
+                # the samples of a batch are only read when it is dispatched
+                return [values[sample_starts[k]:sample_starts[k+1]].tolist() for k in range(i * config.sample_batch_size, min((i + 1) * config.sample_batch_size, len(lengths)))]
+            handle: Optional[Dict[str, Any]] = scheduler.results.pop(("index",) + key, None)
+            # the batches are folded in order, so the result does not depend on the order in which they finish
+            # with adaptive stopping, only a few batches beyond the folded ones are evaluated at a time
+            window: int = max_running if config.adaptive_stopping else batch_count
+            progress: Dict[str, Any] = {"dispatched": 0, "folded": 0, "tracker": None, "finished": False}
+
+            def advance():
+                if progress["finished"]:
+                    return
+                if "counts" in checkpoint:
+                    if progress["tracker"] is None:
+                        progress["tracker"] = SequentialStopping(*checkpoint["counts"], config)
+                    tracker: SequentialStopping = progress["tracker"]
+                    reason: Optional[str] = None
+                    while reason is None and progress["folded"] < batch_count and str(progress["folded"]) in checkpoint.matches:
+                        reason = tracker.add_batch(checkpoint.matches[str(progress["folded"])])
+                        progress["folded"] += 1
+                    if reason is None and progress["folded"] == batch_count:
+                        # all drawn samples are evaluated; fewer than SAMPLE_COUNT means drawing timed out or ran out of start times
+                        if "draw_stop" in checkpoint:
+                            reason = checkpoint["draw_stop"]
+                        else:
+                            # checkpoints of earlier versions
+                            reason = "sample count" if checkpoint["samples_drawn"]["task"] + checkpoint["samples_drawn"]["notask"] >= config.sample_count else "timeout"
+                    if reason is not None:
+                        progress["finished"] = True
+                        estimates[key] = (tracker.epsilon, tracker.delta)
+                        stopping[key] = (reason, tracker.samples)
+                        checkpoint.update(estimate=estimates[key], stopping=stopping[key])
+                        report(key, checkpoint, messages=output_length, samples_task=tracker.samples_task_total, samples_notask=tracker.samples_notask_total, drawn_task=checkpoint["samples_drawn"]["task"], drawn_notask=checkpoint["samples_drawn"]["notask"])
+                        print("System {}, lambda {:.6f}, sample duration {}s: {} samples with tasks, {} without; drew {} samples ({} tasks and {} non-tasks), epsilon {:.10f}, delta {:.10f} ({} after {} samples)".format(*key, tracker.samples_task_total, tracker.samples_notask_total, len(lengths), checkpoint["samples_drawn"]["task"], checkpoint["samples_drawn"]["notask"], *estimates[key], *stopping[key]))
+                        return
+                while progress["dispatched"] < min(batch_count, progress["folded"] + window):
+                    i: int = progress["dispatched"]
+                    progress["dispatched"] += 1
+                    if str(i) in checkpoint.matches:
+                        continue
+
+                    def matched(matches: List[Tuple[int, int]], i: int = i):
+                        attached[key] -= 1
+                        scheduler.results.pop(("match",) + key + (i,), None)
+                        checkpoint.add_matches(i, matches)
+                        if progress["finished"] and attached[key] == 0:
+                            release(key)
+                        advance()
+                    attached[key] = attached.get(key, 0) + 1
+                    scheduler.add(Job(("match",) + key + (i,), compute_matches_batch, [handle, batch(i)], done=matched))
+
+            advance()
+            if "counts" not in checkpoint:
+                scheduler.add(Job(("fold",) + key, advance, dependencies=[("count",) + key], local=True))
+
+        # the index is only needed if there are samples left to evaluate
+        if "samples_drawn" in checkpoint and len(checkpoint.matches) == -(-len(checkpoint.samples()[1]) // config.sample_batch_size):
+            add_match_jobs()
+            return
+        if not suffix_jobs:
+            # the first sample duration which needs an index adds the job for the suffix array
+            suffix_jobs.append(("suffix",) + key[0:2])
+            scheduler.add(Job(suffix_jobs[0], build_suffix_array, [store.directory, stage_args[2], config], memory=40 * output_length))
+        for name in InterArrivalIndex._DURATION_ARRAYS + ["scalars"]:
+            use(key, "index", dict(index_parameters_for(stage_args[2], sample_duration, config), array=name))
+        scheduler.add(Job(("index",) + key, build_index, stage_args + [sample_duration, config], dependencies=suffix_jobs, memory=24 * output_length, done=lambda handle: evict()))
+        dependencies = [("index",) + key] + ([("draw",) + key] if "samples_drawn" not in checkpoint else [])
+        scheduler.add(Job(("dispatch",) + key, add_match_jobs, dependencies=dependencies, local=True))
+
+    computation_start: datetime.datetime = datetime.datetime.now()
+
+    def run_jobs(pool):
+        tracer: Optional[Tracer] = None
+        if config.trace_file is not None:
+            tracer = Tracer(config.trace_file, getattr(pool, "_processes", None), config.profile_stages, config.profile_directory)
+        scheduler = Scheduler(pool, max_running, config.memory_limit, tracer)
+        for system in systems:
+            add_system_jobs(scheduler, system)
+        try:
+            scheduler.run()
+        finally:
+            if tracer is not None:
+                tracer.finish()
+
+    try:
+        if pool is not None:
+            run_jobs(pool)
+        else:
+            context = multiprocessing.get_context(config.multiprocessing_start_method)
+            with context.Pool(initializer=random.seed) as pool:
+                run_jobs(pool)
+    finally:
+        if temporary_directory is not None:
+            temporary_directory.cleanup()
+        elif config.cache_directory is not None:
+            store.evict()
+    if config.cache_directory is None and config.checkpoint_directory is not None:
+        # the results are in the checkpoints, the generated output is not needed anymore
+        shutil.rmtree(store.directory)
+    print("Total duration: {}".format(datetime.datetime.now() - computation_start))
+    return evaluation
+
+
+def write_latex(evaluation: Evaluation, config: Config, filename: str):
+    """
+    Write the results of an evaluation as a LaTeX table (one row per system, two columns per lambda). With several
+    sample durations, there is one row per system and sample duration, with the sample duration in the second column.
+    Results which are missing (e.g. of a run which is not finished yet) are written as "--".
+    """
+    durations: List[float] = config.durations()
+    # the column with the sample duration
+    duration_column: bool = len(durations) > 1
+    results_latex = open(filename, "w")
+    if duration_column:
+        print(" &", end="", file=results_latex)
+    for l, _ in config.lambdas:
+        print(" & \\multicolumn{{2}}{{c}}{{$\\lambda={:.6f}$}}".format(l), end="", file=results_latex)
     print(" \\\\", file=results_latex)
-results_latex.close()
+    if duration_column:
+        print("& $T$ ", end="", file=results_latex)
+    for l, _ in config.lambdas:
+        print("& TI & $\\varepsilon,\\delta$", end="", file=results_latex)
+    print(" \\\\", file=results_latex)
+    for system_id in evaluation.system_ids:
+        for duration in durations:
+            print("{}".format(system_id), end="", file=results_latex)
+            if duration_column:
+                print(" & \\SI{{{}}}{{\\second}}".format(duration), end="", file=results_latex)
+            for lambd, _ in config.lambdas:
+                if (system_id, lambd, duration) not in evaluation.estimates:
+                    print(" & -- & --", end="", file=results_latex)
+                    continue
+                print(" & \\num{{{:1.2f}}}".format(evaluation.traffic_increase[(system_id, lambd)]), end="", file=results_latex)
+                print(" & $\\varepsilon={:.10f}$ $\\delta={:.10f}$".format(*evaluation.estimates[(system_id, lambd, duration)]), end="", file=results_latex)
+                if config.adaptive_stopping:
+                    print(" ({1}, {0})".format(*evaluation.stopping[(system_id, lambd, duration)]), end="", file=results_latex)
+            print(" \\\\", file=results_latex)
+    results_latex.close()
+
+
+def main():
+    # continue the unfinished work of an interrupted run with the same database and settings
+    resume: bool = "--resume" in sys.argv[1:]
+    # only render the LaTeX table of the results file (.jsonl) of a (possibly unfinished) run
+    latex: bool = "--latex" in sys.argv[1:]
+    arguments: List[str] = [argument for argument in sys.argv[1:] if argument not in ("--resume", "--latex")]
+    if len(arguments) < 1:
+        print("Usage: ned.py [--resume] <database>")
+        print("       ned.py --latex <results file>")
+        sys.exit(255)
+    config = Config()
+    if latex:
+        filename: str = arguments[-1][:-len(".jsonl")] if arguments[-1].endswith(".jsonl") else arguments[-1]
+        write_latex(Evaluation.from_results(read_results(filename + ".jsonl")), config, filename + ".tex")
+        return
+    output_file_suffix: str = ""
+    if len(arguments) > 1:
+        output_file_suffix = "-" + arguments[0]
+    filename = socket.gethostname() + output_file_suffix + "-ned-results-" + str(config.sample_count) + "-" + "+".join(str(duration) for duration in config.durations())
+    # the results are written as they are computed, the LaTeX table is rendered from them
+    results = ResultsSink(filename, config.results_formats, resume)
+    try:
+        evaluation = evaluate(arguments[-1], config, resume, results=results)
+    finally:
+        results.close()
+    # print LaTeX table
+    print("System")
+    write_latex(Evaluation.from_results(read_results(results.filename), evaluation.system_ids), config, filename + ".tex")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Licensed under the EUPL
+
+import csv
+import json
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# the fields of a result, in the order of the CSV columns
+FIELDS: List[str] = [
+    "system",
+    "lambda",
+    "description",
+    "sample_duration",
+    "traffic_increase",
+    "messages",
+    "epsilon",
+    "delta",
+    "stopping",
+    "samples",
+    "samples_task",
+    "samples_notask",
+    "drawn_task",
+    "drawn_notask",
+    "seed",
+    "elapsed_since_start",
+    "finished",
+]
+
+
+def result_key(result: Dict[str, Any]) -> Tuple[Union[str, int], float, float]:
+    return result["system"], result["lambda"], result["sample_duration"]
+
+
+def read_results(filename: str) -> List[Dict[str, Any]]:
+    """
+    Read the results written to a JSONL file by a ResultsSink. If a system, lambda and sample duration was written
+    several times (by resumed runs), only the last result is returned.
+    """
+    results: Dict[Tuple[Union[str, int], float, float], Dict[str, Any]] = {}
+    with open(filename) as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                results[result_key(result)] = result
+    return list(results.values())
+
+
+class ResultsSink:
+    """
+    Write the result of every system, lambda and sample duration as soon as it is computed, so partial results can be
+    monitored during a run and the LaTeX table can be rendered again without recomputing (see read_results).
+    The results are written to filename + ".jsonl" (one JSON object per line) and, depending on formats, to
+    filename + ".csv" and to the table "results" of the SQLite database filename + ".sqlite". Unless resume is set,
+    existing files are replaced; otherwise results which were written already are not written again.
+    """
+    def __init__(self, filename: str, formats: Sequence[str] = (), resume: bool = False):
+        for result_format in formats:
+            if result_format not in ("csv", "sqlite"):
+                raise ValueError("Unknown results format: {}".format(result_format))
+        self.filename = filename + ".jsonl"
+        paths: List[str] = [self.filename] + [filename + "." + result_format for result_format in formats]
+        self._written: Dict[Tuple[Union[str, int], float, float], Dict[str, Any]] = {}
+        if resume and os.path.exists(self.filename):
+            self._written = {result_key(result): result for result in read_results(self.filename)}
+        elif not resume:
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        self._file = open(self.filename, "a")
+        self._csv: Optional[csv.DictWriter] = None
+        self._csv_file = None
+        if "csv" in formats:
+            header: bool = not os.path.exists(filename + ".csv")
+            self._csv_file = open(filename + ".csv", "a", newline="")
+            self._csv = csv.DictWriter(self._csv_file, FIELDS, extrasaction="ignore")
+            if header:
+                self._csv.writeheader()
+        self._db: Optional[sqlite3.Connection] = None
+        if "sqlite" in formats:
+            self._db = sqlite3.connect(filename + ".sqlite")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results ({}, PRIMARY KEY (system, lambda, sample_duration));".format(", ".join('"{}"'.format(field) for field in FIELDS)))
+            self._db.commit()
+
+    def write(self, result: Dict[str, Any]):
+        """
+        Write a result (a dictionary with the keys in FIELDS) to all files.
+        """
+        key = result_key(result)
+        if self._written.get(key) == result:
+            return
+        self._written[key] = result
+        print(json.dumps(result, default=str), file=self._file)
+        self._file.flush()
+        if self._csv is not None:
+            self._csv.writerow(result)
+            self._csv_file.flush()
+        if self._db is not None:
+            # system ids are stored as text, since they are numbers or strings
+            values: List[Any] = [str(result.get(field)) if field == "system" else result.get(field) for field in FIELDS]
+            self._db.execute("INSERT OR REPLACE INTO results VALUES ({});".format(", ".join("?" * len(FIELDS))), values)
+            self._db.commit()
+
+    def close(self):
+        self._file.close()
+        if self._csv_file is not None:
+            self._csv_file.close()
+        if self._db is not None:
+            self._db.close()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# Licensed under the EUPL
+
+import collections
+import heapq
+import queue
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+from instrumentation import Tracer, run_instrumented
+
+
+class Job:
+    def __init__(self, name: Hashable, function: Callable, args: Sequence = (), dependencies: Iterable[Hashable] = (), memory: int = 0, local: bool = False, done: Optional[Callable[[Any], None]] = None):
+        """
+        A unit of work for the Scheduler
+        Parameters:
+            name A unique name, used to refer to this job in the dependencies of other jobs
+            function The function to run; it has to be picklable unless the job is local
+            args The arguments for function
+            dependencies Names of the jobs which have to be finished before this job can start
+            memory The estimated peak memory usage of the job (in bytes)
+            local Run the job in the scheduling process instead of the worker pool (for short steps like merging)
+            done Called in the scheduling process with the job's result once it is finished; may add new jobs
+        """
+        self.name = name
+        self.function = function
+        self.args = args
+        self.dependencies = list(dependencies)
+        self.memory = memory
+        self.local = local
+        self.done = done
+
+
+class Scheduler:
+    """
+    Run a graph of jobs on a single worker pool.
+    Jobs start as soon as all of their dependencies are finished, in the order in which they were added. At most
+    max_running jobs are delegated to the pool at once, and a job is only admitted if the estimated memory usage of all
+    running jobs stays within memory_limit (a job which exceeds the limit on its own runs when nothing else does).
+    Jobs may add further jobs when they are done, so the graph can unfold while it is being processed.
+    If a tracer is given, all jobs are measured (see instrumentation.run_instrumented) and recorded by the tracer.
+    """
+    def __init__(self, pool, max_running: int, memory_limit: Optional[int] = None, tracer: Optional[Tracer] = None):
+        self._pool = pool
+        self._tracer = tracer
+        self._max_running = max_running
+        self._memory_limit = memory_limit
+        # jobs whose dependencies are finished, in the order in which they were added
+        self._ready: List[Tuple[int, Job]] = []
+        self._ready_local: Deque[Job] = collections.deque()
+        # number of unfinished dependencies of each waiting job and the jobs waiting for each dependency
+        self._waiting: Dict[Hashable, int] = {}
+        self._dependents: Dict[Hashable, List[Tuple[int, Job]]] = {}
+        self._running: Dict[Hashable, Job] = {}
+        self._finished: Set[Hashable] = set()
+        self._names: Set[Hashable] = set()
+        self._memory_running: int = 0
+        self._completed: "queue.Queue" = queue.Queue()
+        self.results: Dict[Hashable, Any] = {}
+
+    def add(self, job: Job):
+        if job.name in self._names:
+            raise ValueError("Duplicate job name: {}".format(job.name))
+        entry = (len(self._names), job)
+        self._names.add(job.name)
+        unfinished = [dependency for dependency in job.dependencies if dependency not in self._finished]
+        if not unfinished:
+            self._make_ready(entry)
+            return
+        self._waiting[job.name] = len(unfinished)
+        for dependency in unfinished:
+            self._dependents.setdefault(dependency, []).append(entry)
+
+    def _make_ready(self, entry: Tuple[int, Job]):
+        if entry[1].local:
+            self._ready_local.append(entry[1])
+        else:
+            heapq.heappush(self._ready, entry)
+
+    def _admissible(self, job: Job) -> bool:
+        if len(self._running) >= self._max_running:
+            return False
+        if self._memory_limit is None or not self._running:
+            return True
+        return self._memory_running + job.memory <= self._memory_limit
+
+    def _start(self, job: Job):
+        function, args = job.function, job.args
+        if self._tracer is not None:
+            function, args = run_instrumented, (job.function, job.args, self._tracer.profile_file(job.name))
+        if job.local:
+            self._finish(job, function(*args))
+            return
+        self._running[job.name] = job
+        self._memory_running += job.memory
+        self._pool.apply_async(
+            function,
+            args,
+            callback=lambda result: self._completed.put((job.name, result, None)),
+            error_callback=lambda error: self._completed.put((job.name, None, error))
+        )
+
+    def _finish(self, job: Job, result: Any):
+        if self._tracer is not None:
+            result, metrics = result
+            self._tracer.job(job.name, job.local, metrics, len(self._running), self.queue_depth)
+        self.results[job.name] = result
+        self._finished.add(job.name)
+        for entry in self._dependents.pop(job.name, []):
+            self._waiting[entry[1].name] -= 1
+            if self._waiting[entry[1].name] == 0:
+                del self._waiting[entry[1].name]
+                self._make_ready(entry)
+        if job.done is not None:
+            job.done(result)
+
+    def _start_ready(self):
+        while self._ready_local or self._ready:
+            # local jobs do not need a worker
+            while self._ready_local:
+                self._start(self._ready_local.popleft())
+            # start jobs in order; jobs which do not fit right now keep their place
+            skipped: List[Tuple[int, Job]] = []
+            while self._ready and len(self._running) < self._max_running and len(skipped) < self._max_running and not self._ready_local:
+                entry = heapq.heappop(self._ready)
+                if self._admissible(entry[1]):
+                    self._start(entry[1])
+                else:
+                    skipped.append(entry)
+            for entry in skipped:
+                heapq.heappush(self._ready, entry)
+            if not self._ready_local:
+                break
+
+    def run(self):
+        """
+        Process jobs until all jobs (including the ones added while running) are finished.
+        """
+        while True:
+            self._start_ready()
+            if not self._running:
+                if self._waiting:
+                    raise RuntimeError("Jobs with unsatisfiable dependencies: {}".format(", ".join(str(name) for name in self._waiting)))
+                break
+            # wait for a job to finish
+            name, result, error = self._completed.get()
+            job = self._running.pop(name)
+            self._memory_running -= job.memory
+            if error is not None:
+                raise error
+            self._finish(job, result)
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        The number of jobs waiting for their dependencies or for a free slot
+        """
+        return len(self._ready) + len(self._ready_local) + len(self._waiting)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
@@ -4,7 +4,7 @@
 
 from decimal import Decimal
 import os
-from typing import Dict, Union
+from typing import Dict, List, Union
 
 lambdas = [
     (-1.0, "No dummy traffic"),
@@ -29,9 +29,18 @@ INTERARRIVAL_THRESHOLDS = {
 SAMPLE_COUNT = 1000
 # how long does the attacker sample data (in seconds)?
 SAMPLE_DURATION = 10
+# evaluate several sample durations (in seconds) against the same system output, e.g. [5, 10, 30, 60]; None evaluates
+# SAMPLE_DURATION only
+SAMPLE_DURATIONS = None
 # timeout for generating samples (in seconds)
 SAMPLE_TIMEOUT = 900
 
+# messages with presence information count as user interactions if they are sent by a device whose description matches
+# one of these SQLite GLOB patterns (e.g. "*3S*" matches push-buttons) ...
+INTERACTION_PATTERNS: List[str] = ["*3S*", "F *.*", "* KF *.*"]
+# ... or if they belong to one of these systems (where only interactive devices send presence information)
+INTERACTION_SYSTEMS: List[Union[int, str]] = [3]
+
 # timestamp precision of the different systems
 TIMESTAMP_PRECISION: Dict[Union[int, str], float] = {
     1: 1.0,
@@ -39,3 +48,72 @@ TIMESTAMP_PRECISION: Dict[Union[int, str], float] = {
     "2.2": 1.0,
     3: 0.001,
 }
+
+# how to generate dummy traffic: "numpy" draws dummies in batches, "python" is the (slow) reference implementation
+DUMMY_BACKEND = "numpy"
+
+# generate the dummy traffic for all lambdas from the same random numbers (unit-rate exponential draws scaled by
+# 1/lambda) instead of independently, so the results vary smoothly across lambdas and the random numbers are only drawn
+# once; requires the "numpy" backend
+LAMBDA_SWEEP = False
+
+# master seed for all random numbers (dummy traffic and sample start times); with a seed, runs are reproducible
+# regardless of the number of workers and of which outputs are taken from the cache, and the seed becomes part of the
+# cache keys. None draws fresh random numbers
+SEED = None
+
+# how many inter-arrival times are used as the key when indexing the system output for matching samples
+IA_INDEX_DEPTH = 4
+
+# how to estimate epsilon and delta: "sample" evaluates up to SAMPLE_COUNT random samples, "exact" sweeps all samples
+# once (SAMPLE_COUNT and SAMPLE_TIMEOUT are ignored)
+ESTIMATION_MODE = "sample"
+
+# directory for caching genuine messages, generated system output and user interactions between runs (None disables it)
+CACHE_DIRECTORY = "ned-cache"
+# maximum size of the cache (in bytes); the least recently used entries are removed when it grows larger
+CACHE_MAX_BYTES = 16 * 1024**3
+
+# number of samples sent to a worker process at once when estimating epsilon and delta
+SAMPLE_BATCH_SIZE = 20
+# start method for worker processes ("fork", "spawn" or "forkserver"); None uses the platform's default
+MULTIPROCESSING_START_METHOD = None
+
+# maximum number of jobs (e.g. generating a chunk of dummy traffic or evaluating a batch of samples) delegated to the
+# worker processes at once; None uses twice the number of CPUs
+MAX_RUNNING_JOBS = None
+# estimated memory (in bytes) all running jobs may use together; jobs are held back while they would exceed it
+# None disables the limit
+MEMORY_LIMIT = None
+
+# the messages of every system are read by the worker processes in partitions of about this many messages
+INGEST_PARTITION_ROWS = 1000000
+
+# besides the JSONL file from which the LaTeX table is rendered, write the results as they are computed in these formats:
+# "csv" and/or "sqlite" (a database with the table "results")
+RESULTS_FORMATS: List[str] = ["csv"]
+
+# stop evaluating samples (ESTIMATION_MODE "sample") once epsilon and delta have converged instead of always evaluating
+# all SAMPLE_COUNT samples; the reason for stopping and the number of evaluated samples are added to the results
+ADAPTIVE_STOPPING = False
+# epsilon and delta have converged once STOPPING_PATIENCE consecutive batches of SAMPLE_BATCH_SIZE samples did not
+# increase either of them by more than STOPPING_TOLERANCE ...
+STOPPING_PATIENCE = 10
+STOPPING_TOLERANCE = 0.001
+# ... or once, with confidence STOPPING_CONFIDENCE, a further sample increases them with a probability of at most
+# STOPPING_INCREASE_PROBABILITY
+STOPPING_CONFIDENCE = 0.95
+STOPPING_INCREASE_PROBABILITY = 0.01
+
+# directory for the progress of each system and lambda, so an interrupted run can be continued with --resume
+# (None disables checkpoints)
+CHECKPOINT_DIRECTORY = "ned-checkpoints"
+
+# write the wall time, CPU time, peak memory usage and item counts of every job (per stage, system and lambda) as well
+# as the utilization of the worker processes to this file as JSONL (None disables it)
+TRACE_FILE = None
+# stages to run under cProfile if TRACE_FILE is set (e.g. ["generate", "match"]; stages are "ingest", "generate",
+# "merge", "count", "draw", "index", "dispatch", "match", "fold" and "exact"); one profile per job is written to
+# PROFILE_DIRECTORY
+PROFILE_STAGES: List[str] = []
+PROFILE_DIRECTORY = "ned-profiles"
@@ -0,0 +1,38 @@
+# Licensed under the EUPL
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark  # noqa: E402
+from config import Config  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def database(tmp_path_factory) -> str:
+    """
+    A small synthetic database (see benchmark.generate_database)
+    """
+    filename = str(tmp_path_factory.mktemp("database") / "ned.sqlite")
+    benchmark.generate_database(filename, message_count=6000, seed=1)
+    return filename
+
+
+@pytest.fixture
+def config(tmp_path) -> Config:
+    """
+    A config for quick evaluations, which writes no files outside of tmp_path
+    """
+    return Config(
+        lambdas=[(-1.0, "none"), (0.01, "low"), (0.1, "high")],
+        sample_count=60,
+        sample_timeout=10,
+        seed=1,
+        cache_directory=str(tmp_path / "cache"),
+        checkpoint_directory=None,
+        max_running_jobs=4,
+        trace_file=None,
+    )
@@ -0,0 +1,35 @@
+# Licensed under the EUPL
+
+import numpy
+import pytest
+
+import ned
+from traces import random_trace
+
+
+def totals(trace) -> tuple:
+    arguments = [trace[name] for name in ("system_id", "to_ts", "sample_duration", "config")]
+    return ned.compute_sample_totals(trace["output_messages"], trace["interactions"], *arguments), ned.compute_sample_totals_python(trace["output_messages"].tolist(), trace["interactions"].tolist(), *arguments)
+
+
+@pytest.mark.parametrize("system_id", [1, 3])
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("to_ts_offset", [0.0, 30.0, -5.0])
+def test_totals_match_the_reference(system_id, seed, to_ts_offset):
+    vectorized, reference = totals(random_trace(system_id, 2000, seed, to_ts_offset))
+    assert vectorized == reference
+
+
+@pytest.mark.parametrize("count", [0, 1, 2])
+def test_totals_of_tiny_outputs(count):
+    trace = random_trace(1, max(count, 1), 0)
+    trace["output_messages"] = trace["output_messages"][0:count]
+    vectorized, reference = totals(trace)
+    assert vectorized == reference
+
+
+def test_totals_without_interactions():
+    trace = random_trace(3, 2000, 0)
+    trace["interactions"] = numpy.zeros(0, dtype=numpy.int64)
+    vectorized, reference = totals(trace)
+    assert vectorized == reference
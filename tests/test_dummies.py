@@ -0,0 +1,29 @@
+# Licensed under the EUPL
+
+import numpy
+import pytest
+
+import ned
+from config import Config
+
+
+def genuine_messages(system_id, count: int = 3000, seed: int = 0) -> numpy.ndarray:
+    # IA times with bursts and a few outages, in the system's timestamp precision
+    config = Config()
+    rng = numpy.random.default_rng(seed)
+    ia_times = numpy.where(rng.random(count) < 0.3, rng.exponential(1.0, count), rng.exponential(15.0, count))
+    ia_times[rng.random(count) < 0.002] += 2 * config.interarrival_thresholds[system_id] * config.timestamp_precision[system_id]
+    return numpy.rint(1300000000 / config.timestamp_precision[system_id] + numpy.cumsum(ia_times) / config.timestamp_precision[system_id]).astype(numpy.int64)
+
+
+@pytest.mark.parametrize("system_id", [1, 3])
+@pytest.mark.parametrize("subset", [[0.01], [0.1], [-1.0, 0.05], [0.05, 0.01]])
+def test_sweep_subset_matches_full_sweep(system_id, subset):
+    # regenerating some lambdas of a sweep (e.g. after their outputs were evicted) draws the same random numbers
+    config = Config()
+    genuine = genuine_messages(system_id)
+    sweep = [-1.0, 0.01, 0.05, 0.1]
+    full = dict(zip(sweep, ned.compute_ned_dummies_sweep(genuine, system_id, sweep, config, seed=7)))
+    partial = ned.compute_ned_dummies_sweep(genuine, system_id, subset, config, seed=7, sweep=sweep)
+    for lambd, output in zip(subset, partial):
+        numpy.testing.assert_array_equal(output, full[lambd])
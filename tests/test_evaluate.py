@@ -0,0 +1,57 @@
+# Licensed under the EUPL
+
+import json
+import os
+
+import pytest
+
+import ned
+from cache import ArtifactCache
+
+
+def test_eviction_keeps_artifacts_of_queued_match_jobs(database, config):
+    # adaptive stopping finishes estimates while match batches are still queued; evicting down to a single byte after
+    # every stage must not remove the artifacts they attach to
+    config = config.replace(cache_max_bytes=1, adaptive_stopping=True, stopping_patience=1, sample_batch_size=5, seed=2)
+    evaluation = ned.evaluate(database, config)
+    assert len(evaluation.estimates) == len(evaluation.system_ids) * len(config.lambdas)
+    # everything is evicted after the run
+    assert not [name for name in os.listdir(config.cache_directory) if name.endswith(".npy")]
+
+
+def results_of(evaluation: ned.Evaluation):
+    return evaluation.traffic_increase, evaluation.estimates, evaluation.stopping
+
+
+@pytest.mark.parametrize("backend, sweep", [("numpy", False), ("python", False), ("numpy", True)])
+def test_seeded_results_do_not_depend_on_the_number_of_jobs(database, config, backend, sweep):
+    config = config.replace(cache_directory=None, dummy_backend=backend, lambda_sweep=sweep)
+    first = ned.evaluate(database, config.replace(max_running_jobs=1))
+    second = ned.evaluate(database, config.replace(max_running_jobs=4))
+    assert results_of(first) == results_of(second)
+
+
+def test_seeded_sweep_is_reproducible_after_eviction(database, config):
+    # the evicted output is regenerated on its own, from the random numbers of the whole sweep
+    config = config.replace(lambda_sweep=True)
+    first = ned.evaluate(database, config)
+    for name in os.listdir(config.cache_directory):
+        if name.startswith("output-") and name.endswith(".json"):
+            with open(os.path.join(config.cache_directory, name)) as f:
+                parameters = json.load(f)["parameters"]
+            if parameters["system"] == 1 and parameters["lambd"] == 0.01:
+                ArtifactCache(config.cache_directory).remove("output", parameters)
+    second = ned.evaluate(database, config)
+    assert results_of(first) == results_of(second)
+
+
+def test_seeded_sweep_is_reproducible_after_resume(database, config, tmp_path):
+    # the unfinished lambda is regenerated on its own, the others are restored from their checkpoints
+    config = config.replace(lambda_sweep=True, cache_directory=None, checkpoint_directory=str(tmp_path / "checkpoints"))
+    first = ned.evaluate(database, config)
+    for run_directory in os.listdir(config.checkpoint_directory):
+        for name in os.listdir(os.path.join(config.checkpoint_directory, run_directory)):
+            if name.startswith("1-0.01"):
+                os.remove(os.path.join(config.checkpoint_directory, run_directory, name))
+    second = ned.evaluate(database, config, resume=True)
+    assert results_of(first) == results_of(second)
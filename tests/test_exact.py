@@ -0,0 +1,80 @@
+# Licensed under the EUPL
+
+import math
+from typing import Dict, List, Tuple
+
+import numpy
+import pytest
+
+import ned
+from traces import random_trace
+
+
+def brute_force(trace) -> Tuple[float, float, int, int]:
+    """
+    Classify every sample start time the way the sampling loop does and compute epsilon and delta over the histogram of
+    all observed samples
+    """
+    output_messages: numpy.ndarray = trace["output_messages"]
+    output_ia_times: numpy.ndarray = trace["output_ia_times"]
+    interactions: numpy.ndarray = trace["interactions"]
+    threshold: int = trace["config"].interarrival_thresholds[trace["system_id"]]
+    sample_duration: int = trace["sample_duration"]
+    n: int = len(output_messages)
+    starts = numpy.arange(trace["from_ts"] + 1, trace["to_ts"] - sample_duration + 1)
+    # skip start times close to or inside an outage
+    in_outage = numpy.zeros(len(starts), dtype=bool)
+    for insert_p in (numpy.searchsorted(output_messages, starts), numpy.searchsorted(output_messages, starts + sample_duration)):
+        inside = (insert_p > 0) & (insert_p < n)
+        in_outage[inside] |= output_ia_times[insert_p[inside] - 1] > threshold
+    starts = starts[~in_outage]
+    first = numpy.searchsorted(output_messages, starts)
+    k = numpy.searchsorted(interactions, starts)
+    task = (k < len(interactions)) & (interactions[numpy.minimum(k, len(interactions) - 1)] - starts <= sample_duration) if len(interactions) > 0 else numpy.zeros(len(starts), dtype=bool)
+    histogram: Dict[Tuple[int, ...], List[int]] = {}
+    tails: Dict[int, Tuple[int, ...]] = {}
+    for start, p, is_task in zip(starts.tolist(), first.tolist(), task.tolist()):
+        sample: Tuple[int, ...] = ()
+        if p < n and output_messages[p] - start <= sample_duration:
+            if p not in tails:
+                end = p + 1
+                while end < n and output_ia_times[end - 1] <= sample_duration:
+                    end += 1
+                tails[p] = tuple(output_ia_times[p:end-1].tolist())
+            sample = (int(output_messages[p]) - start,) + tails[p]
+        histogram.setdefault(sample, [0, 0])[0 if is_task else 1] += 1
+    total_task = sum(counts[0] for counts in histogram.values())
+    total_notask = sum(counts[1] for counts in histogram.values())
+    epsilon = delta = 0.0
+    for matches_task, matches_notask in histogram.values():
+        prob_1 = matches_task / total_task if total_task > 0 else 0.0
+        prob_2 = matches_notask / total_notask if total_notask > 0 else 0.0
+        if prob_1 == 0.0 or prob_2 == 0.0:
+            delta = max(delta, prob_1, prob_2)
+        else:
+            epsilon = max(epsilon, math.log(max(prob_1, prob_2) / min(prob_1, prob_2)))
+    return epsilon, delta, total_task, total_notask
+
+
+def exact(trace) -> Tuple[float, float, int, int]:
+    return ned.estimate_exact(*(trace[name] for name in ("output_messages", "output_ia_times", "interactions", "system_id", "from_ts", "to_ts", "sample_duration", "config")))
+
+
+def assert_equal(result, reference):
+    assert result[2:] == reference[2:]
+    assert result[0:2] == pytest.approx(reference[0:2], rel=1e-12)
+
+
+@pytest.mark.parametrize("system_id, count, sample_duration", [(1, 600, 10.0), (1, 600, 3.0), (3, 60, 2.0)])
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("to_ts_offset", [0.0, 20.0, -4.0])
+def test_exact_equals_the_brute_force(system_id, count, sample_duration, seed, to_ts_offset):
+    trace = random_trace(system_id, count, seed, to_ts_offset, sample_duration)
+    assert_equal(exact(trace), brute_force(trace))
+
+
+@pytest.mark.parametrize("interactions", ["none", "all"])
+def test_exact_with_one_kind_of_samples(interactions):
+    trace = random_trace(1, 300, 0)
+    trace["interactions"] = trace["output_messages"] if interactions == "all" else trace["interactions"][0:0]
+    assert_equal(exact(trace), brute_force(trace))
@@ -0,0 +1,20 @@
+# Licensed under the EUPL
+
+import numpy
+import pytest
+
+import instrumentation
+
+
+def allocate(size: int) -> int:
+    array = numpy.ones(size // 8)
+    return int(array[-1])
+
+
+@pytest.mark.skipif(not instrumentation.reset_peak_rss(), reason="the peak RSS can only be reset on Linux")
+def test_max_rss_is_measured_per_job():
+    # a small job after a large one in the same process reports its own peak, not the one of the large job
+    _, large = instrumentation.run_instrumented(allocate, [400 * 1024**2])
+    _, small = instrumentation.run_instrumented(allocate, [1024**2])
+    assert large["max_rss"] - small["max_rss"] > 300 * 1024**2
+    assert instrumentation.lifetime_peak_rss() >= large["max_rss"]
@@ -0,0 +1,96 @@
+# Licensed under the EUPL
+
+import bisect
+import random
+from typing import List, Tuple
+
+import numpy
+import pytest
+
+import ned
+from cache import ArtifactCache
+from traces import random_trace
+
+
+def reference_matches(trace, sample: List[int]) -> Tuple[int, int]:
+    """
+    compute_matches before the InterArrivalIndex: a scan over the whole output per sample
+    """
+    output_messages: List[int] = trace["output_messages"].tolist()
+    output_ia_times: List[int] = trace["output_ia_times"].tolist()
+    interactions: List[int] = trace["interactions"].tolist()
+    threshold: int = trace["config"].interarrival_thresholds[trace["system_id"]]
+    sample_duration: int = trace["sample_duration"]
+    matches_task = matches_notask = 0
+    if not sample:
+        for ia_time in output_ia_times:
+            if ia_time <= threshold and ia_time > sample_duration:
+                matches_notask += ia_time - sample_duration
+    elif len(sample) == 1:
+        for i in range(1, len(output_ia_times)):
+            if output_ia_times[i] > threshold or output_ia_times[i-1] > threshold:
+                continue
+            if output_ia_times[i] > sample_duration and output_ia_times[i-1] > sample[0]:
+                insert_p = bisect.bisect_left(interactions, output_messages[i])
+                if insert_p < len(interactions) and output_messages[i] == interactions[insert_p]:
+                    matches_task += 1
+                else:
+                    matches_notask += 1
+    else:
+        i = 0
+        while i < len(output_ia_times) - len(sample):
+            # go to the next distinct timestamp
+            if output_ia_times[i] == 0:
+                while i < len(output_ia_times) and output_ia_times[i] == 0:
+                    i += 1
+            else:
+                i += 1
+            if output_ia_times[i-1] <= sample[0]:
+                continue
+            if any(output_ia_times[i+j-1] != sample[j] for j in range(1, len(sample))):
+                continue
+            if output_messages[i+len(sample)] - output_messages[i] <= sample_duration:
+                continue
+            if bisect.bisect_left(interactions, output_messages[i]) != bisect.bisect_left(interactions, output_messages[i] + sample_duration):
+                matches_task += 1
+            else:
+                matches_notask += 1
+    return matches_task, matches_notask
+
+
+def samples_of(trace, seed: int) -> List[List[int]]:
+    # empty and single-message samples, samples drawn from the output (which match at least once) and random ones
+    samples_drawn = {"task": 0, "notask": 0}
+    config = trace["config"].replace(sample_count=150, sample_timeout=10)
+    drawn = ned.draw_samples(trace["output_messages"], trace["output_ia_times"], trace["interactions"], trace["system_id"], trace["from_ts"], trace["to_ts"], trace["sample_duration"], samples_drawn, config, seed)
+    rng = random.Random(seed)
+    ia_times = sorted(set(trace["output_ia_times"].tolist()))
+    return [[], [0], [trace["sample_duration"]]] + [[rng.randint(0, trace["sample_duration"])] for _ in range(10)] + list(drawn) + [[rng.randint(0, trace["sample_duration"])] + rng.choices(ia_times[0:5], k=rng.randint(1, 6)) for _ in range(30)]
+
+
+@pytest.mark.parametrize("system_id", [1, 3])
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("depth", [1, 4])
+def test_matches_equal_the_scan(system_id, seed, depth):
+    trace = random_trace(system_id, 800, seed, to_ts_offset=-3.0)
+    config = trace["config"].replace(ia_index_depth=depth)
+    index = ned.InterArrivalIndex(trace["output_messages"], trace["output_ia_times"], trace["interactions"], system_id, trace["sample_duration"], config)
+    samples = samples_of(trace, seed)
+    assert any(len(sample) > depth + 1 for sample in samples)
+    results = [ned.compute_matches(index, sample) for sample in samples]
+    assert results == [reference_matches(trace, sample) for sample in samples]
+    # samples drawn from the output match at least once
+    assert sum(task + notask for task, notask in results) > 0
+
+
+def test_attached_index_equals_the_built_one(tmp_path):
+    # the workers attach to the index through the store
+    trace = random_trace(3, 800, 0)
+    store = ArtifactCache(str(tmp_path))
+    output_messages = store.store("output", {}, trace["output_messages"])
+    output_ia_times = store.store("ia", {}, trace["output_ia_times"])
+    index = ned.InterArrivalIndex(output_messages, output_ia_times, trace["interactions"], 3, trace["sample_duration"], trace["config"])
+    index.save(store, {"suffix": True}, {"depth": trace["config"].ia_index_depth})
+    samples = samples_of(trace, 0)
+    assert ned.compute_matches_batch(index.handle(), samples) == [reference_matches(trace, sample) for sample in samples]
+    numpy.testing.assert_array_equal(ned.InterArrivalIndex.attach(index.handle())._positions, index._positions)
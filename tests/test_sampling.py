@@ -0,0 +1,99 @@
+# Licensed under the EUPL
+
+from typing import Set, Tuple
+
+import numpy
+import pytest
+
+import ned
+from traces import random_trace
+
+
+def classify_start_times(trace) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    Check every sample start time the way the rejection loop did. Returns the start times and whether each one is
+    valid (neither it nor the end of its sample lies in an outage) and contains an interaction.
+    """
+    output_messages: numpy.ndarray = trace["output_messages"]
+    interactions: numpy.ndarray = trace["interactions"]
+    threshold: int = trace["config"].interarrival_thresholds[trace["system_id"]]
+    sample_duration: int = trace["sample_duration"]
+    starts = numpy.arange(trace["from_ts"] + 1, trace["to_ts"] - sample_duration + 1)
+    valid = numpy.ones(len(starts), dtype=bool)
+    for insert_p in (numpy.searchsorted(output_messages, starts), numpy.searchsorted(output_messages, starts + sample_duration)):
+        inside = (insert_p > 0) & (insert_p < len(output_messages))
+        valid[inside] &= trace["output_ia_times"][insert_p[inside] - 1] <= threshold
+    k = numpy.searchsorted(interactions, starts)
+    task = (k < len(interactions)) & (interactions[numpy.minimum(k, len(interactions) - 1)] - starts <= sample_duration) if len(interactions) > 0 else numpy.zeros(len(starts), dtype=bool)
+    return starts, valid, task
+
+
+def start_index(trace) -> ned.SampleStartIndex:
+    return ned.SampleStartIndex(*(trace[name] for name in ("output_messages", "output_ia_times", "interactions", "system_id", "from_ts", "to_ts", "sample_duration", "config")))
+
+
+def expand(intervals: Tuple[numpy.ndarray, numpy.ndarray]) -> numpy.ndarray:
+    return numpy.concatenate([numpy.arange(a, b + 1) for a, b in zip(*intervals)]) if len(intervals[0]) > 0 else numpy.zeros(0, dtype=numpy.int64)
+
+
+def draw(trace, sample_count: int, seed: int = 0):
+    samples_drawn = {"task": 0, "notask": 0}
+    config = trace["config"].replace(sample_count=sample_count, sample_timeout=60)
+    generator = ned.draw_samples(trace["output_messages"], trace["output_ia_times"], trace["interactions"], trace["system_id"], trace["from_ts"], trace["to_ts"], trace["sample_duration"], samples_drawn, config, seed)
+    samples = []
+    while True:
+        try:
+            samples.append(next(generator))
+        except StopIteration as stop:
+            return samples, samples_drawn, stop.value
+
+
+@pytest.mark.parametrize("system_id, count, sample_duration", [(1, 2000, 10.0), (1, 2000, 3.0), (3, 300, 10.0)])
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("to_ts_offset", [0.0, 20.0, -4.0])
+def test_start_times_equal_the_rejection_checks(system_id, count, sample_duration, seed, to_ts_offset):
+    trace = random_trace(system_id, count, seed, to_ts_offset, sample_duration)
+    starts, valid, task = classify_start_times(trace)
+    index = start_index(trace)
+    numpy.testing.assert_array_equal(expand(index.task), starts[valid & task])
+    numpy.testing.assert_array_equal(expand(index.notask), starts[valid & ~task])
+    assert (index.task_count, index.notask_count) == (numpy.count_nonzero(valid & task), numpy.count_nonzero(valid & ~task))
+
+
+@pytest.mark.parametrize("system_id, count", [(1, 300), (3, 60)])
+def test_drawn_samples_are_samples_of_valid_start_times(system_id, count):
+    trace = random_trace(system_id, count, 1, sample_duration=5.0)
+    starts, valid, task = classify_start_times(trace)
+    output_messages = trace["output_messages"].tolist()
+    possible: Set[Tuple[int, ...]] = set()
+    for start in starts[valid].tolist():
+        # assemble the sample like the rejection loop did
+        sample = []
+        for i in range(int(numpy.searchsorted(trace["output_messages"], start)), len(output_messages)):
+            difference = output_messages[i] - (start if not sample else output_messages[i-1])
+            if difference > trace["sample_duration"]:
+                break
+            sample.append(difference)
+        possible.add(tuple(sample))
+    samples, samples_drawn, reason = draw(trace, 100)
+    assert reason == "sample count"
+    assert samples_drawn["task"] + samples_drawn["notask"] == len(samples) == len({tuple(sample) for sample in samples}) == 100
+    assert {tuple(sample) for sample in samples} <= possible
+
+
+def test_drawing_stops_when_no_start_times_are_left():
+    # without interactions, only no-task start times exist; once the no-task samples exceed the balance, no start
+    # times of the needed kind are left
+    trace = random_trace(3, 2000, 0)
+    trace["interactions"] = trace["interactions"][0:0]
+    samples, samples_drawn, reason = draw(trace, 2000)
+    assert reason == "exhausted"
+    assert samples_drawn == {"task": 0, "notask": 901}
+
+
+def test_drawing_without_start_times():
+    # the system is shorter than a sample
+    trace = random_trace(1, 2, 0)
+    trace["to_ts"] = trace["from_ts"] + trace["sample_duration"]
+    samples, samples_drawn, reason = draw(trace, 10)
+    assert (samples, reason) == ([], "exhausted")
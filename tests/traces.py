@@ -0,0 +1,44 @@
+# Licensed under the EUPL
+
+from typing import Any, Dict, Union
+
+import numpy
+
+from config import Config
+
+# outage thresholds (in seconds) small enough for short traces to contain outages
+THRESHOLD_SECONDS = 60
+
+
+def trace_config(system_id: Union[str, int]) -> Config:
+    config = Config()
+    thresholds: Dict[Union[str, int], int] = dict(config.interarrival_thresholds)
+    thresholds[system_id] = round(THRESHOLD_SECONDS / config.timestamp_precision[system_id])
+    return config.replace(interarrival_thresholds=thresholds)
+
+
+def random_trace(system_id: Union[str, int], count: int, seed: int, to_ts_offset: float = 0.0, sample_duration: float = 10.0) -> Dict[str, Any]:
+    """
+    A random system output in the system's timestamp precision with the arguments the estimation stages take. The IA
+    times mostly take a few distinct values (so multi-message samples match elsewhere in the output), some are 0
+    (messages with the same timestamp) and some are outages. Interactions are output messages. to_ts lies to_ts_offset
+    seconds after the last message (before it if negative).
+    """
+    config = trace_config(system_id)
+    precision: float = config.timestamp_precision[system_id]
+    rng = numpy.random.default_rng(seed)
+    ia_seconds = numpy.where(rng.random(count) < 0.7, rng.choice([0, 1, 2, 3, 5, 8, 13], count), rng.exponential(6.0, count))
+    outages = rng.random(count) < 0.02
+    ia_seconds[outages] += THRESHOLD_SECONDS * (1 + rng.random(numpy.count_nonzero(outages)))
+    output_messages = numpy.cumsum(numpy.rint(ia_seconds / precision).astype(numpy.int64)) + round(1300000000 / precision)
+    interactions = numpy.unique(output_messages[rng.random(count) < 0.1])
+    return {
+        "output_messages": output_messages,
+        "output_ia_times": numpy.diff(output_messages),
+        "interactions": interactions,
+        "system_id": system_id,
+        "from_ts": int(output_messages[0]),
+        "to_ts": int(output_messages[-1]) + round(to_ts_offset / precision),
+        "sample_duration": round(sample_duration / precision),
+        "config": config,
+    }